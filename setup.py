@@ -16,6 +16,9 @@ setup(
         "python-dotenv>=0.19.0",
         "prompt-toolkit>=3.0.0",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0"],
+    },
     entry_points={
         "console_scripts": [
             "model-completer=model_completer.cli:main",
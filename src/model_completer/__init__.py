@@ -10,13 +10,30 @@ __author__ = "Model CLI Autocomplete Team"
 from .completer import ModelCompleter
 from .enhanced_completer import EnhancedCompleter
 from .client import OllamaClient
-from .ollama_manager import OllamaManager, create_ollama_manager
-from .training import create_trainer, TrainingConfig, TrainingDataManager, LoRATrainer
 from .utils import load_config, setup_logging
 from .cache import CacheManager
 
-# Main CLI function
-from .cli import main
+# Loaded on first access: the completion CLI imports this package on every
+# Tab press and never needs the Ollama manager, training or CLI entry point
+_LAZY_ATTRS = {
+    'OllamaManager': '.ollama_manager',
+    'create_ollama_manager': '.ollama_manager',
+    'create_trainer': '.training',
+    'TrainingConfig': '.training',
+    'TrainingDataManager': '.training',
+    'LoRATrainer': '.training',
+    'main': '.cli',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'ModelCompleter',
@@ -14,7 +14,6 @@ sys.path.insert(0, os.path.abspath(src_dir))
 from model_completer.enhanced_completer import EnhancedCompleter
 from model_completer.client import OllamaClient
 from model_completer.utils import load_config, setup_logging
-from model_completer.training import create_trainer
 
 def get_ai_completion(command: str, config: Optional[Dict] = None) -> str:
     """Get AI completion using enhanced completer with personalization."""
@@ -66,6 +65,7 @@ def main():
             print("Could not connect to Ollama server")
     elif args.train:
         print("🚀 Starting LoRA training...")
+        from model_completer.training import create_trainer
         trainer = create_trainer()
         data_file = "src/training/zsh_training_data.jsonl"
         success = trainer.train(data_file)
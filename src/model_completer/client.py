@@ -1,7 +1,7 @@
-import requests
+import hashlib
 import json
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 from .cache import CacheManager
 import logging
 
@@ -14,33 +14,38 @@ class OllamaClient:
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
         self.cache = CacheManager()
+        self._session = None
+    
+    @property
+    def session(self):
+        """One pooled keep-alive connection for every request this client makes.
+        
+        requests is imported here rather than at module level: it is the most
+        expensive import in the package, and a Tab press answered from the
+        completion cache never touches the network.
+        """
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
     
     def is_server_available(self) -> bool:
         """Check if Ollama server is available."""
+        import requests
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=2)
             return response.status_code == 200
         except requests.exceptions.RequestException:
             return False
     
-    def generate_completion(self, prompt: str, model: str, 
-                          context: Optional[Dict] = None, 
-                          use_cache: bool = True) -> str:
-        """Generate completion using Ollama API."""
-        
-        # Check cache first
-        cache_key = f"completion:{model}:{hash(prompt)}"
-        if use_cache:
-            cached_result = self.cache.get(cache_key)
-            if cached_result:
-                logger.debug("Cache hit for prompt: %s", prompt[:50])
-                return cached_result
-        
-        # Prepare request data with optimized parameters for speed
+    def _build_request_data(self, prompt: str, model: str,
+                            context: Optional[Dict] = None,
+                            stream: bool = False) -> Dict[str, Any]:
+        """Prepare request data with optimized parameters for speed."""
         data = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": stream,
             "options": {
                 "temperature": 0.1,
                 "top_p": 0.9,
@@ -53,13 +58,38 @@ class OllamaClient:
         
         if context:
             data["context"] = context
+        return data
+    
+    def generate_completion(self, prompt: str, model: str, 
+                          context: Optional[Dict] = None, 
+                          use_cache: bool = True,
+                          timeout: Optional[float] = None) -> str:
+        """Generate completion using Ollama API.
+        
+        timeout overrides the client default for this request only.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        
+        # Check cache first. The key must be stable across processes, which the
+        # builtin (randomized) hash() is not.
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        cache_key = f"completion:{model}:{prompt_hash}"
+        if use_cache:
+            cached_result = self.cache.get(cache_key)
+            if cached_result:
+                logger.debug("Cache hit for prompt: %s", prompt[:50])
+                return cached_result
+        
+        import requests
+        data = self._build_request_data(prompt, model, context, stream=False)
         
         try:
             start_time = time.time()
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
                 json=data,
-                timeout=self.timeout
+                timeout=timeout
             )
             elapsed_time = time.time() - start_time
             
@@ -79,17 +109,70 @@ class OllamaClient:
                 
         except requests.exceptions.Timeout:
             # Timeout is expected for interactive use - use debug level
-            logger.debug("Request to Ollama timed out after %ds (expected for fast fallback)", self.timeout)
+            logger.debug("Request to Ollama timed out after %ds (expected for fast fallback)", timeout)
             return ""
         except requests.exceptions.RequestException as e:
             # Only log non-timeout errors as warnings
             logger.warning("Request to Ollama failed: %s", e)
             return ""
     
-    def get_available_models(self) -> list:
+    def generate_completion_stream(self, prompt: str, model: str,
+                                   context: Optional[Dict] = None,
+                                   timeout: Optional[float] = None) -> Iterator[str]:
+        """Stream completion text chunks from Ollama API as they are generated.
+        
+        Closing the generator early closes the HTTP connection, which makes
+        Ollama stop generating tokens nobody is going to read.
+        
+        timeout bounds the whole call, not just each read: with stream=True
+        requests applies it per socket read, so a server trickling tokens
+        would otherwise keep the caller waiting indefinitely.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        import requests
+        data = self._build_request_data(prompt, model, context, stream=True)
+        
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=data,
+                timeout=timeout,
+                stream=True
+            )
+        except requests.exceptions.Timeout:
+            logger.debug("Streaming request to Ollama timed out after %ds", timeout)
+            return
+        except requests.exceptions.RequestException as e:
+            logger.warning("Streaming request to Ollama failed: %s", e)
+            return
+        
+        with response:
+            if response.status_code != 200:
+                logger.error("Ollama API error: %s - %s", response.status_code, response.text)
+                return
+            try:
+                for raw_line in response.iter_lines():
+                    if time.monotonic() >= deadline:
+                        logger.debug("Streaming from Ollama stopped at the %ss deadline", timeout)
+                        break
+                    if not raw_line:
+                        continue
+                    chunk = json.loads(raw_line)
+                    text = chunk.get("response", "")
+                    if text:
+                        yield text
+                    if chunk.get("done"):
+                        break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.debug("Streaming from Ollama interrupted: %s", e)
+    
+    def get_available_models(self, timeout: float = 5) -> list:
         """Get list of available models from Ollama."""
+        import requests
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
             if response.status_code == 200:
                 data = response.json()
                 return [model['name'] for model in data.get('models', [])]
@@ -1,11 +1,144 @@
 import os
+import re
 import subprocess
-from typing import List, Optional, Dict, Any
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, List, Optional, Dict, Any, Tuple
 from .client import OllamaClient
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Seconds cached git info may be reused even if HEAD and the index are unchanged,
+# which bounds how stale unstaged working-tree changes can get
+_GIT_INFO_TTL = 2.0
+
+# Environment for read-only git calls: the user's own, so git resolves the same
+# config and repository as their shell, with GIT_OPTIONAL_LOCKS=0 to keep
+# status/diff from taking the index lock and the C locale to skip message
+# translation.
+_GIT_ENV = {**os.environ, 'GIT_OPTIONAL_LOCKS': '0', 'LC_ALL': 'C'}
+
+# Explanatory lines the model emits instead of a command (case-sensitive,
+# matched at the start of the line). get_suggestions checks the shorter list.
+_UI_REJECT_PREFIXES = (
+    'To complete', 'This will', 'You can', 'Enter', 'Run:', 'Note:', '```',
+    'Environment:', 'User:', 'Host:', 'Directory:', 'Recent:', 'Replace',
+)
+_REJECT_PREFIXES = _UI_REJECT_PREFIXES + (
+    'Suggestion:', 'Implement:', 'Provide', 'Git commit is', 'Remember,', 'By following',
+    'Start by', 'Next,', 'After that', 'The command', 'You are a', 'Complete the command',
+    'Command to complete', 'Sure,', 'Here', 'This flag', 'This option', 'This command',
+    'Input:', 'Output:', 'input:', 'output:',
+)
+
+
+def _group_by_first_char(prefixes: Tuple[str, ...]) -> Dict[str, Tuple[str, ...]]:
+    """Group prefixes by their first character.
+    
+    A line whose first character is not a key cannot start with any of the
+    prefixes, so one dict lookup rejects most lines before any startswith.
+    """
+    table: Dict[str, Tuple[str, ...]] = {}
+    for prefix in prefixes:
+        table[prefix[0]] = table.get(prefix[0], ()) + (prefix,)
+    return table
+
+
+def _starts_with_any(line: str, table: Dict[str, Tuple[str, ...]]) -> bool:
+    """Check a non-empty line against a _group_by_first_char table."""
+    bucket = table.get(line[0])
+    return bucket is not None and line.startswith(bucket)
+
+
+# Reject prefixes bucketed by first character
+_UI_REJECT_TABLE = _group_by_first_char(_UI_REJECT_PREFIXES)
+_REJECT_TABLE = _group_by_first_char(_REJECT_PREFIXES)
+# Numbered and bulleted list items
+_LIST_ITEM_RE = re.compile(r'(?:[1-9]|10)\.|[-*•] ')
+_UI_LIST_ITEM_RE = re.compile(r'[1-5]\.|[-*•] ')
+
+
+def _git_state_key(cwd: str) -> Optional[Tuple[int, int]]:
+    """Get mtimes of HEAD and the index for the repository containing cwd.
+    
+    Returns None when no plain .git directory is found; the cache then only
+    expires by TTL.
+    """
+    path = cwd
+    while True:
+        git_dir = os.path.join(path, '.git')
+        if os.path.lexists(git_dir):
+            try:
+                head_mtime = os.stat(os.path.join(git_dir, 'HEAD')).st_mtime_ns
+            except OSError:
+                # .git file (worktree/submodule) - not worth resolving here
+                return None
+            try:
+                index_mtime = os.stat(os.path.join(git_dir, 'index')).st_mtime_ns
+            except OSError:
+                index_mtime = 0
+            return head_mtime, index_mtime
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+# Fields before the path on each porcelain v2 entry type (ordinary,
+# renamed/copied, unmerged)
+_STATUS_V2_PATH_FIELD = {'1': 8, '2': 9, 'u': 10}
+
+
+def _parse_status_v2_branch(output: str) -> Tuple[str, str]:
+    """Split `git status --porcelain=v2 --branch` output into branch and a
+    `git status --short` style listing."""
+    branch = ''
+    entries = []
+    for line in output.splitlines():
+        kind = line[:1]
+        if kind == '#':
+            if line.startswith('# branch.head '):
+                branch = line[14:]
+                if branch == '(detached)':
+                    branch = ''
+        elif kind == '?':
+            entries.append('?? ' + line[2:])
+        elif kind in _STATUS_V2_PATH_FIELD:
+            fields = line.split(' ', _STATUS_V2_PATH_FIELD[kind])
+            xy = fields[1].replace('.', ' ')
+            path = fields[-1]
+            if kind == '2':
+                path, _, orig_path = path.partition('\t')
+                path = f"{orig_path} -> {path}"
+            entries.append(f"{xy} {path}")
+    return branch, '\n'.join(entries)
+
+
+def _read_git_state() -> Optional[Tuple[str, str]]:
+    """Get the branch and short status of the current directory's repository.
+    
+    Returns None outside a git work tree.
+    """
+    try:
+        # One call yields both the branch and the status, and fails outside a
+        # work tree just like rev-parse --is-inside-work-tree would
+        result = subprocess.run(['git', 'status', '--porcelain=v2', '--branch'],
+                                check=True, capture_output=True, text=True, env=_GIT_ENV)
+        branch, status = _parse_status_v2_branch(result.stdout)
+        return branch, status.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+@lru_cache(maxsize=32)
+def _cached_git_state(cwd: str, state: Optional[Tuple[int, int]],
+                      ttl_bucket: int) -> Optional[Tuple[str, str]]:
+    """Memoize _read_git_state per directory, HEAD/index state and TTL window."""
+    return _read_git_state()
+
+
 class ModelCompleter:
     """Main completion class that handles command completion logic."""
     
@@ -15,7 +148,8 @@ class ModelCompleter:
         timeout = self.config.get('ollama', {}).get('timeout', 30)
         self.client = OllamaClient(ollama_url, timeout=timeout)
         self.model = model
-        self.history: List[str] = []
+        # Last 10 commands; the deque drops older ones on append
+        self.history: Deque[str] = deque(maxlen=10)
         
     def build_prompt(self, command: str, context: Optional[Dict] = None, 
                    for_ui: bool = False) -> str:
@@ -28,7 +162,7 @@ class ModelCompleter:
         git_info = self._get_git_info()
         
         # Get recent command history (last 5 commands)
-        recent_commands = self.history[-5:] if self.history else []
+        recent_commands = list(self.history)[-5:]
         
         if for_ui:
             prompt_template = """Complete: {command}
@@ -52,35 +186,30 @@ Output:"""
         
         return prompt
     
+    def _get_git_state(self) -> Optional[Tuple[str, str]]:
+        """Get the git branch and short status, or None outside a repository.
+        
+        Cached on the working directory plus the mtimes of .git/HEAD and
+        .git/index, so repeated calls skip the git subprocess until the
+        branch or staged state changes or the short TTL runs out.
+        """
+        cwd = os.getcwd()
+        ttl_bucket = int(time.monotonic() // _GIT_INFO_TTL)
+        return _cached_git_state(cwd, _git_state_key(cwd), ttl_bucket)
+    
     def _get_git_info(self) -> str:
-        """Get git repository information."""
-        try:
-            # Check if we're in a git repo
-            subprocess.run(['git', 'rev-parse', '--is-inside-work-tree'], 
-                         check=True, capture_output=True, text=True)
-            
-            # Get current branch
-            branch_result = subprocess.run(['git', 'branch', '--show-current'],
-                                         capture_output=True, text=True)
-            branch = branch_result.stdout.strip()
-            
-            # Get status
-            status_result = subprocess.run(['git', 'status', '--short'],
-                                         capture_output=True, text=True)
-            status = status_result.stdout.strip()
-            
-            git_info = f"- Git Branch: {branch}\n- Git Status: {status}" if status else f"- Git Branch: {branch}"
-            return git_info
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        """Get git repository information as prompt lines."""
+        state = self._get_git_state()
+        if state is None:
             return ""
+        branch, status = state
+        return f"- Git Branch: {branch}\n- Git Status: {status}" if status else f"- Git Branch: {branch}"
     
     def get_completion(self, command: str, use_cache: bool = True) -> str:
         """Get completion using fine-tuned zsh-assistant model."""
         # Update history
         if command and (not self.history or self.history[-1] != command):
             self.history.append(command)
-            # Keep only last 10 commands
-            self.history = self.history[-10:]
         
         model_to_use = self.model
         if self.model != "zsh-assistant":
@@ -102,11 +231,9 @@ Output:"""
             # Extract the completion from the response
             import re
             
-            # First, clean up common prefixes/suffixes
-            completion_text = completion.strip()
-            
             # Handle multiline responses - look for Output: line first
-            lines = completion_text.split('\n')
+            # (lines are stripped one at a time, so the whole text is not)
+            lines = completion.splitlines()
             output_line = None
             
             for line in lines:
@@ -146,15 +273,13 @@ Output:"""
                 line = line.strip()
                 
                 # Look for lines that look like actual commands
-                if (line and 
-                    len(line) > len(command) and
+                # Cheap length and boundary checks before the regexes
+                if (len(line) > len(command) and
                     ' ' in line and
-                    not line.startswith(('To complete', 'This will', 'You can', 'Enter', 'Run:', 'Note:', '```', 'Environment:', 'User:', 'Host:', 'Directory:', 'Recent:', 'Replace', 'This will launch', 'You can now', 'This will display', 'Suggestion:', 'Implement:', 'Provide', 'Git commit is', 'Remember,', 'By following', 'Start by', 'Next,', 'After that', 'The command', 'You are a', 'Complete the command', 'Command to complete', 'Sure,', 'Here', 'This flag', 'This option', 'This command', 'Input:', 'Output:', 'input:', 'output:')) and
-                    not line.startswith(('1.', '2.', '3.', '4.', '5.', '- ', '* ', '• ', '6.', '7.', '8.', '9.', '10.')) and
-                    not line.endswith(':') and
-                    not line.startswith('$') and
-                    not line.startswith('`') and
-                    not line.endswith('`')):
+                    line[0] not in '$`' and
+                    line[-1] not in ':`' and
+                    not _LIST_ITEM_RE.match(line) and
+                    not _starts_with_any(line, _REJECT_TABLE)):
                     logger.debug(f"Using fine-tuned model ({model_to_use}): {line}")
                     return line
                     
@@ -173,7 +298,6 @@ Output:"""
         # Update history
         if command and (not self.history or self.history[-1] != command):
             self.history.append(command)
-            self.history = self.history[-10:]
         
         prompt = self.build_prompt(command, for_ui=True)
         completion = self.client.generate_completion(
@@ -182,16 +306,13 @@ Output:"""
         
         # Parse multiple suggestions from response
         suggestions = []
-        lines = completion.strip().split('\n')
-        
-        for line in lines:
+        for line in completion.splitlines():
             line = line.strip()
             # Skip empty lines, numbered lists, and explanatory text
-            if (line and 
-                not line.startswith(('1.', '2.', '3.', '4.', '5.', '- ', '* ', '• ')) and
-                not line.startswith(('To complete', 'This will', 'You can', 'Enter', 'Run:', 'Note:', '```', 'Environment:', 'User:', 'Host:', 'Directory:', 'Recent:', 'Replace', 'This will launch', 'You can now', 'This will display')) and
-                len(line) > len(command) and
-                not line.endswith(':')):
+            if (len(line) > len(command) and
+                not line.endswith(':') and
+                not _UI_LIST_ITEM_RE.match(line) and
+                not _starts_with_any(line, _UI_REJECT_TABLE)):
                 
                 # Clean up the suggestion
                 suggestion = line
@@ -2,18 +2,460 @@
 """Enhanced completer with personalization and history tracking."""
 
 import os
+import re
 import json
 import subprocess
+import atexit
+import heapq
+import queue
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import closing
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from collections import Counter
+from typing import Iterator, List, Optional, Dict, Any, Tuple
+from datetime import datetime
+from collections import Counter, deque
 from .client import OllamaClient
-from .completer import ModelCompleter
+from .completer import ModelCompleter, _GIT_ENV, _group_by_first_char, _starts_with_any
 import logging
 
 logger = logging.getLogger(__name__)
 
+# orjson is optional; it encodes/decodes history lines several times faster
+try:
+    import orjson
+    _json_loads = orjson.loads
+    
+    def _json_line(obj: Any) -> bytes:
+        """Encode obj as one newline-terminated JSON line."""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    
+    def _json_loads_lines(lines: List[bytes]) -> List[Any]:
+        """Decode a list of JSON lines, skipping any that are malformed."""
+        objs = []
+        for line in lines:
+            try:
+                objs.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                pass
+        return objs
+except ImportError:
+    _json_loads = json.loads
+    _JSON_DECODER = json.JSONDecoder()
+    # Whitespace between JSON values, as json.loads skips it
+    _JSON_WS_RE = re.compile(r'[ \t\n\r]*')
+    
+    def _json_line(obj: Any) -> bytes:
+        """Encode obj as one newline-terminated JSON line."""
+        return (json.dumps(obj) + '\n').encode('utf-8')
+    
+    def _json_loads_lines(lines: List[bytes]) -> List[Any]:
+        """Decode a list of JSON lines, skipping any that are malformed.
+        
+        The lines are decoded to text once and walked with raw_decode, which
+        is about twice as fast as json.loads per line: json.loads re-detects
+        the encoding and decodes every bytes line separately.
+        """
+        text = b'\n'.join(lines).decode('utf-8', 'replace')
+        raw_decode = _JSON_DECODER.raw_decode
+        skip_ws = _JSON_WS_RE.match
+        objs = []
+        end = skip_ws(text).end()
+        while end < len(text):
+            try:
+                obj, end = raw_decode(text, end)
+                objs.append(obj)
+            except ValueError:
+                # Resume at the line after the malformed one
+                end = text.find('\n', end)
+                if end < 0:
+                    break
+            end = skip_ws(text, end).end()
+        return objs
+
+# Shared pool for local work that overlaps with the Ollama round-trip
+_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+# Conventional commit types accepted from the model
+_VALID_TYPES = frozenset({'feat', 'fix', 'refactor', 'docs', 'test', 'chore', 'perf', 'style', 'build', 'ci'})
+# Whole messages that are placeholders rather than real commit messages
+_REJECTED_EXACT = frozenset({'wip', 'commit message', 'message'})
+# Subjects (text after "type:") that are placeholders
+_PLACEHOLDER_SUBJECTS = frozenset({'message', 'commit message'})
+_REJECTED_SUBJECTS = _PLACEHOLDER_SUBJECTS | {'commit'}
+# Bare messages without a subject that are too generic to use
+_GENERIC_MESSAGES = frozenset({'update', 'changes', 'fix', 'feat', 'chore'})
+# "verb + noun" subjects made only of these words are too generic
+_GENERIC_VERBS = frozenset({'enhance', 'improve', 'update', 'add'})
+_GENERIC_NOUNS = frozenset({'functionality', 'feature', 'code', 'completion', 'implementation'})
+# Generic subjects, matched anywhere in a lowercased subject
+_GENERIC_SUBJECT_RE = re.compile(
+    r'(?:add new|enhance|improve|update|add) functionality|(?:improve|update) code|'
+    r'(?:add|new|update) feature|(?:enhance|improve|update) completion'
+)
+# Words that suggest a commit type when the model gave an invalid one
+_FEAT_WORDS_RE = re.compile(r'add|new|feature|implement|create')
+_FIX_WORDS_RE = re.compile(r'fix|bug|error|issue|resolve')
+_REFACTOR_WORDS_RE = re.compile(r'refactor|simplify|restructure')
+# "Input:"/"Output:" labels echoed from the prompt in front of a commit message
+_IO_LABEL_RE = re.compile(r'^\s*(?:input|output):\s*', re.IGNORECASE)
+# "Conventional Commit Message:" and/or "Commit Message:" labels before a message
+_COMMIT_LABEL_RE = re.compile(
+    r'^\s*(?:Conventional Commit Message:\s*)?(?:Commit Message:\s*)?', re.IGNORECASE
+)
+# Parenthetical remark at the end of a commit message line
+_TRAILING_PAREN_RE = re.compile(r'\s*\([^)]*\)\s*$')
+# "(Added by ...)" attributions anywhere in a commit message line
+_ADDED_BY_RE = re.compile(r'\s*\(Added by[^)]*\)')
+# Conventional-commit type prefix of a message
+_COMMIT_TYPE_PREFIX_RE = re.compile(
+    r'^(?:feat|fix|chore|docs|refactor|test|style|perf|build|ci):\s*', re.IGNORECASE
+)
+# Method names in added diff lines that hint at what a change does
+_DIFF_METHOD_WORDS_RE = re.compile(
+    r'generate|create|process|handle|analyze|extract|parse|build|setup|init|train|'
+    r'complete|fix|add|implement|improve|enhance|refactor|update|delete|remove|save|'
+    r'load|get|set|send|receive|validate|check|verify',
+    re.IGNORECASE
+)
+# Assignment targets in added diff lines worth reporting
+_DIFF_ASSIGN_WORDS_RE = re.compile(
+    r'result|output|data|config|model|client|handler|manager|service|api|response|'
+    r'request|error|exception|value|item|obj|instance|completion|prediction|message|'
+    r'commit|diff|context|prompt|feature|functionality',
+    re.IGNORECASE
+)
+# Conditions in added diff lines that indicate error handling or validation
+_DIFF_CONDITION_WORDS_RE = re.compile(
+    r'error|exception|none|empty|valid|check|verify|exists|available|found',
+    re.IGNORECASE
+)
+# Bookkeeping fragments (mostly this module's own) that say nothing about a change
+_DIFF_GENERIC_FEATURE_RE = re.compile(
+    r'function_context|key_changes|seen\.add|capture_output|diff_result|prompt_parts|'
+    r'context_parts|if diff_result|if len\(|if not |if any\(|if stripped|for f in|'
+    r'for line in|for imp in|parts =|line =|f_lower =|module ='
+)
+
+# Explanatory (non-command) lines the model tends to emit, lower-cased and
+# bucketed by first character so most lines are rejected by one dict lookup
+_BAD_PREFIX_TABLE = _group_by_first_char((
+    'to complete', 'this will', 'you can', 'you should', 'enter', 'run:', 'note:', 'environment:',
+    'user:', 'host:', 'directory:', 'recent:', 'replace', 'suggestion:', 'implement:', 'provide',
+    'git commit is', 'remember,', 'by following', 'start by', 'next,', 'after that', 'the command',
+    'you are a', 'complete the command', 'complete command:', 'command to complete', 'sure,', 'here',
+    'this flag', 'this option', 'this command', 'context:', 'project:', 'git branch:',
+    'recent files:', 'user frequently', 'format:', 'output:',
+))
+# Phrases that mark a line as placeholder or explanation wherever they appear
+_REJECT_PHRASE_RE = re.compile(r'commit message|the logical|next step|you should|complete command:')
+# Explanatory and list lines around a generated commit message (case-sensitive)
+_COMMIT_SKIP_RE = re.compile(
+    r'(?:Generate|Format:|Examples:|Changes:|Project:|File types:|Here|Sure|This|'
+    r'[123]\.|[-*] |•)'
+)
+# Directories with more files than this skip the recent-files listing: it
+# would cost a stat per file and says little about what the user is doing
+_MAX_RECENT_FILE_SCAN = 500
+# Most (directory, mtime) project contexts kept by a long-lived completer
+_CTX_CACHE_MAX_ENTRIES = 32
+# Changes below this many lines that only touch docs, tests or CI config get
+# a commit message derived from their paths, without asking the model
+_HEURISTIC_COMMIT_MAX_LINES = 50
+# CI configuration files outside .github/workflows
+_CI_FILE_NAMES = frozenset({'.gitlab-ci.yml', '.travis.yml', 'azure-pipelines.yml', 'jenkinsfile'})
+# Test files by suffix, besides test_*.py and tests/ directories
+_TEST_FILE_SUFFIXES = ('_test.py', '_test.go', '.test.js', '.test.ts', '.spec.js', '.spec.ts')
+# Where command history is kept
+_HISTORY_DIR = Path.home() / '.cache' / 'model-completer'
+# Quoted package.json keys of the frameworks recognized in project detection
+_FRAMEWORK_KEYS = (b'"react"', b'"vue"', b'"express"')
+# Most recent history entries kept in memory
+_HISTORY_MAX_ENTRIES = 100
+# Only this much of the end of the history file is read on startup; the
+# last 100 entries fit in it several times over
+_HISTORY_TAIL_BYTES = 64 * 1024
+# History files larger than this are cut back to their newest entries
+_HISTORY_ROTATE_BYTES = 10 * 1024 * 1024
+# Entries kept when the history file is cut back
+_HISTORY_ROTATE_KEEP = 1000
+# Most history entries written by one background append
+_HISTORY_WRITE_BATCH = 32
+# A usable completion is always among the first few non-blank, non-fence response lines
+_MAX_COMPLETION_LINES = 4
+# A markdown code-fence line, optionally naming a language (```bash)
+_CODE_FENCE_RE = re.compile(r'```[\w+-]*')
+# Commit commands: `git comm...` at the start or `git commit` anywhere
+_COMMIT_CMD_RE = re.compile(r'\s*git comm|.*?git commit', re.DOTALL)
+# Commit commands that do not already carry a message (-m / --message)
+_SMART_COMMIT_RE = re.compile(r'(?!.*-m)(?:\s*git comm|.*?git commit)', re.DOTALL)
+# `git commit -a` / `--all` commits unstaged changes too
+_COMMIT_ALL_RE = re.compile(r'\s(?:--all\b|-[^-\s]*a)')
+# A partially typed `git comm...` at the start of a command
+_PARTIAL_COMMIT_RE = re.compile(r'git\s+comm\w*')
+# Trailing short-flag cluster that already ends in -m (e.g. `-am`)
+_MESSAGE_FLAG_END_RE = re.compile(r'\s-[^-\s]*m$')
+# History sources whose completions may be replayed for later prefixes
+_PREFIX_CACHE_SOURCES = frozenset({'ai', 'training_data'})
+# A cached prefix must cover at least this share of the typed command
+_PREFIX_CACHE_MIN_COVERAGE = 0.7
+# Seconds after which a recorded completion is no longer replayed
+_PREFIX_CACHE_TTL = 24 * 3600
+
+
+def _run_git_concurrently(commands: List[List[str]], timeout: float) -> List[bytes]:
+    """Run independent read-only git commands in parallel and return their stdout.
+    
+    Raises subprocess.TimeoutExpired (after killing every process) if any
+    command does not finish within timeout, and subprocess.CalledProcessError
+    if any exits non-zero (e.g. outside a repository).
+    """
+    procs = [subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=_GIT_ENV)
+             for args in commands]
+    try:
+        outputs = [proc.communicate(timeout=timeout)[0] for proc in procs]
+    except subprocess.TimeoutExpired:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+        raise
+    for args, proc, output in zip(commands, procs, outputs):
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, args, output)
+    return outputs
+
+
+def _parse_status_v2(data: bytes) -> List[Tuple[str, str]]:
+    """Parse `git status --porcelain=v2 -z` output into (XY, path) pairs.
+    
+    XY holds the staged and unstaged status letters, '.' meaning unchanged;
+    untracked files are reported as '??'. Paths are NUL-terminated, so no
+    quoting or escaping has to be undone.
+    """
+    entries = []
+    records = iter(data.split(b'\0'))
+    for record in records:
+        kind = record[:1]
+        if kind == b'1':
+            fields = record.split(b' ', 8)
+            xy, path = fields[1], fields[8]
+        elif kind == b'2':
+            fields = record.split(b' ', 9)
+            xy, path = fields[1], fields[9]
+            # Renames and copies are followed by the original path
+            next(records, None)
+        elif kind == b'u':
+            fields = record.split(b' ', 10)
+            xy, path = fields[1], fields[10]
+        elif kind == b'?':
+            xy, path = b'??', record[2:]
+        else:
+            continue
+        entries.append((xy.decode('ascii'), path.decode('utf-8', 'replace')))
+    return entries
+
+
+def _path_commit_type(path: str) -> Optional[str]:
+    """Get the conventional commit type implied by a changed path, if any."""
+    lower = path.lower()
+    name = os.path.basename(lower)
+    if lower.startswith('.github/workflows/') or name in _CI_FILE_NAMES:
+        return 'ci'
+    if (name.startswith('test_') or name.endswith(_TEST_FILE_SUFFIXES) or
+            lower.startswith('tests/') or '/tests/' in lower):
+        return 'test'
+    if name.endswith(('.md', '.rst')) or lower.startswith('docs/'):
+        return 'docs'
+    return None
+
+
+def _commit_command(command: str, message: str) -> str:
+    """Build the `git commit` command line that records message.
+    
+    Flags the user already typed (e.g. -a) are kept and the message is
+    appended. The message is shell-quoted: it can contain file names, and the
+    widget inserts the result into the user's command line verbatim.
+    """
+    base = _PARTIAL_COMMIT_RE.sub('git commit', command.strip(), count=1)
+    quoted = shlex.quote(message)
+    if _MESSAGE_FLAG_END_RE.search(base):
+        return f"{base} {quoted}"
+    return f"{base} -m {quoted}"
+
+
+def _heuristic_commit_message(changes: Dict[str, Any]) -> Optional[str]:
+    """Describe a small change touching only docs, tests or CI config from its paths.
+    
+    Returns None when the change is large, mixes types or touches code, in
+    which case the model has to read the diff.
+    """
+    files = changes['files_changed']
+    if not files or changes['lines_added'] + changes['lines_removed'] >= _HEURISTIC_COMMIT_MAX_LINES:
+        return None
+    types = {_path_commit_type(f) for f in files}
+    if len(types) != 1 or None in types:
+        return None
+    if len(files) == len(changes['files_added']):
+        verb = 'add'
+    elif len(files) == len(changes['files_deleted']):
+        verb = 'remove'
+    else:
+        verb = 'update'
+    subject = f"{verb} {os.path.basename(files[0])}"
+    if len(files) > 1:
+        subject += f" and {len(files) - 1} more"
+    return f"{types.pop()}: {subject}"
+
+
+def _git_head_lines(args: List[str], max_lines: int, timeout: float) -> List[str]:
+    """Run a read-only git command and decode only the first max_lines of its output.
+    
+    Output is read as git produces it and git is killed once enough lines
+    have arrived, so a large diff is neither buffered nor decoded in full.
+    Returns [] if git prints nothing or fails; raises
+    subprocess.TimeoutExpired if it runs longer than timeout.
+    """
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=_GIT_ENV)
+    timer = threading.Timer(timeout, proc.kill)
+    timer.start()
+    try:
+        head = list(islice(proc.stdout, max_lines))
+        truncated = len(head) == max_lines
+        if truncated:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+    if not truncated:
+        if returncode < 0:
+            raise subprocess.TimeoutExpired(args, timeout)
+        if returncode:
+            return []
+    if not head:
+        return []
+    return b''.join(head).decode('utf-8', 'replace').split('\n')
+
+
+@lru_cache(maxsize=1)
+def _ensure_history_dir() -> Path:
+    """Create the history directory once per process."""
+    _HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    return _HISTORY_DIR
+
+
+def _fd_is_current(fd: int, path: Path) -> bool:
+    """Whether fd still refers to the file at path, i.e. it was not replaced
+    by a rotation or removed since fd was opened."""
+    try:
+        return os.path.samestat(os.fstat(fd), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _read_tail_lines(f, size: int, count: int) -> List[bytes]:
+    """Read the last count non-empty lines of a binary file of the given size.
+    
+    Starts with the last _HISTORY_TAIL_BYTES and only reads further back when
+    that window holds fewer lines, so the cost does not grow with the file.
+    """
+    window = _HISTORY_TAIL_BYTES
+    while True:
+        start = max(0, size - window)
+        f.seek(start)
+        data = f.read()
+        if start:
+            # Drop the partial line we seeked into
+            data = data[data.find(b'\n') + 1:]
+        lines = [line for line in data.split(b'\n') if line.strip()]
+        if len(lines) >= count or not start:
+            return lines[-count:]
+        window *= 4
+
+
+def _completion_candidates(lines: Iterator[str]) -> Iterator[str]:
+    """Clean up to _MAX_COMPLETION_LINES response lines for the acceptance check.
+    
+    Blank lines and code-fence lines are skipped without counting toward the
+    limit, so a fenced answer still reaches the command inside it.
+    """
+    candidates = (raw.strip() for raw in lines)
+    candidates = (line.replace('```', '').strip() for line in candidates
+                  if line and not _CODE_FENCE_RE.fullmatch(line))
+    return islice((line for line in candidates if line), _MAX_COMPLETION_LINES)
+
+
+def _command_base(command: str) -> str:
+    """Get the program name (first word) of a command."""
+    parts = command.split(None, 1)
+    return parts[0] if parts else ''
+
+
+def _normalize_command(command: str) -> str:
+    """Lowercase a command and collapse its whitespace for prefix-cache keys."""
+    return ' '.join(command.lower().split())
+
+
+def _is_acceptable(line: str, command: str, cmd_lower: str, cmd_first: str) -> bool:
+    """Check whether a cleaned AI response line looks like a completion of command."""
+    # Cheapest rejections first: most candidate lines fail on length or shape
+    if len(line) <= len(command):
+        return False
+    # Commands start with a letter or a path; this one character test also
+    # rules out list markers, prompt characters and inline code
+    first = line[0]
+    if not (first.isalpha() or first in './'):
+        return False
+    # Headings and inline code end on ':' or '`'; table rows contain '|'
+    if line[-1] in ':`' or '|' in line[:20]:
+        return False
+    
+    line_lower = line.lower()
+    # Reject "commit message" placeholders and explanatory text
+    if (line_lower == 'message' or _REJECT_PHRASE_RE.search(line_lower) or
+            _starts_with_any(line_lower, _BAD_PREFIX_TABLE)):
+        return False
+    
+    # Accepted lines almost always start with the command, so try that first
+    return (line_lower.startswith(cmd_lower) or cmd_lower in line_lower or
+            line.startswith(cmd_first))
+
+
+class ProjectContext:
+    """Project facts detected from the working directory.
+    
+    A slotted class rather than a dict or dataclass: fixed fields, attribute
+    access, and no dataclasses/inspect import on every Tab press.
+    """
+    
+    __slots__ = ('project_type', 'languages', 'frameworks', 'has_docker', 'has_k8s',
+                 'has_python', 'has_node', 'files', 'git_unstaged', 'git_staged')
+    
+    def __init__(self):
+        self.project_type = 'unknown'
+        self.languages: List[str] = []
+        self.frameworks: List[str] = []
+        self.has_docker = False
+        self.has_k8s = False
+        self.has_python = False
+        self.has_node = False
+        self.files: List[str] = []
+        # Only filled in for a bare `git` command
+        self.git_unstaged = 0
+        self.git_staged = 0
+    
+    def copy(self) -> 'ProjectContext':
+        """Return a shallow copy."""
+        other = ProjectContext.__new__(ProjectContext)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+
 class EnhancedCompleter(ModelCompleter):
     """Completer with personalization and workflow learning."""
     
@@ -21,118 +463,363 @@ class EnhancedCompleter(ModelCompleter):
                  model: str = "zsh-assistant", config: Optional[Dict] = None):
         super().__init__(ollama_url, model, config)
         self.history_file = self._get_history_file()
-        self.command_history = self._load_history()
-        self.project_context = self._detect_project_context()
-        
+        # Bounded, so appending past the limit drops the oldest entry in O(1)
+        self.command_history = deque(self._load_history(), maxlen=_HISTORY_MAX_ENTRIES)
+        # Program-name counts over command_history, kept in step by _save_command
+        self._base_counts = Counter()
+        # Program name -> last few (sequence number, command) saved with it
+        self._similar_index = {}
+        self._history_seq = 0
+        for h in self.command_history:
+            # Entries written before 'base' was stored get it filled in here
+            base = h.get('base')
+            if base is None:
+                base = h['base'] = _command_base(h['command'])
+            self._base_counts[base] += 1
+            self._index_similar(h['command'], base)
+        # (cwd, cwd mtime) -> detected project context
+        self._ctx_cache = {}
+        # package.json path -> (mtime, frameworks it depends on)
+        self._pkg_cache = {}
+        # History lines are appended by a background writer, see _save_command
+        self._save_queue = queue.SimpleQueue()
+        self._save_thread = None
+        # (working dir, normalized command prefix) -> completion accepted there earlier
+        self._prefix_cache = {}
+        for entry in self.command_history:
+            self._remember_prefix(entry)
+        # Detected on first use; a prefix-cache hit never needs it
+        self._project_context = None
+        # Branch parsed by the last _build_enhanced_prompt call
+        self._git_branch: Optional[str] = None
+    
+    @property
+    def project_context(self) -> 'ProjectContext':
+        """Project context for the working directory, detected on first access."""
+        if self._project_context is None:
+            self._project_context = self._get_project_context()
+        return self._project_context
+    
+    @project_context.setter
+    def project_context(self, value: 'ProjectContext'):
+        self._project_context = value
+    
     def _get_history_file(self) -> Path:
         """Get path to history file."""
-        history_dir = Path.home() / '.cache' / 'model-completer'
-        history_dir.mkdir(parents=True, exist_ok=True)
-        return history_dir / 'command_history.jsonl'
+        return _ensure_history_dir() / 'command_history.jsonl'
     
     def _load_history(self) -> List[Dict[str, Any]]:
         """Load command history from file."""
         history = []
-        if self.history_file.exists():
-            try:
-                with open(self.history_file, 'r') as f:
-                    for line in f:
-                        if line.strip():
-                            history.append(json.loads(line))
-            except Exception as e:
-                logger.warning(f"Failed to load history: {e}")
-        return history[-100:]  # Keep last 100 commands
+        try:
+            with open(self.history_file, 'rb') as f:
+                lines = _read_tail_lines(f, os.fstat(f.fileno()).st_size, _HISTORY_MAX_ENTRIES)
+            # Keep last 100 commands, parsing only those. A malformed line (e.g.
+            # one cut short when the writer was stopped at exit) is skipped
+            # rather than costing the rest of the history.
+            history = [entry for entry in _json_loads_lines(lines) if isinstance(entry, dict)]
+        except FileNotFoundError:
+            # No history yet; the writer's append creates the file
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to load history: {e}")
+        return history
     
-    def _save_command(self, command: str, completion: str, context: Dict[str, Any]):
-        """Save command to history."""
+    def _save_command(self, command: str, completion: str, context: Dict[str, Any],
+                      cwd: Optional[str] = None):
+        """Save command to history; cwd defaults to the current directory."""
         entry = {
             'timestamp': datetime.now().isoformat(),
             'command': command,
             'completion': completion,
             'context': context,
-            'working_dir': os.getcwd()
+            'working_dir': cwd or os.getcwd(),
+            # Program name, split out once and reused by the pattern indexes
+            'base': _command_base(command)
         }
+        # Keep history manageable: the deque is about to drop its oldest entry
+        if len(self.command_history) == self.command_history.maxlen:
+            old_base = self.command_history[0]['base']
+            self._base_counts[old_base] -= 1
+            if self._base_counts[old_base] <= 0:
+                del self._base_counts[old_base]
+        self.command_history.append(entry)
+        self._base_counts[entry['base']] += 1
+        self._index_similar(command, entry['base'])
+        self._remember_prefix(entry)
+        
+        # Persist off the completion path; the file append happens while the
+        # completion is being returned to the shell
+        if self._save_thread is None:
+            self._save_thread = threading.Thread(target=self._history_writer, daemon=True)
+            self._save_thread.start()
+            atexit.register(self._flush_history)
+        self._save_queue.put(entry)
+    
+    def _history_writer(self):
+        """Append queued history entries to the history file in batches.
+        
+        The file is opened once on the first batch and kept open as a raw
+        O_APPEND descriptor, so each batch costs a single write() call. That
+        also keeps a batch in one piece when several shells share the file.
+        If another shell rotated the file in the meantime, the descriptor is
+        reopened on the new file before the batch is written.
+        """
+        history_fd = None
         try:
-            with open(self.history_file, 'a') as f:
-                f.write(json.dumps(entry) + '\n')
-            self.command_history.append(entry)
-            # Keep history manageable
-            if len(self.command_history) > 100:
-                self.command_history = self.command_history[-100:]
-        except Exception as e:
-            logger.warning(f"Failed to save history: {e}")
+            while True:
+                entry = self._save_queue.get()
+                if entry is None:
+                    return
+                batch = [entry]
+                stop = False
+                while len(batch) < _HISTORY_WRITE_BATCH:
+                    try:
+                        entry = self._save_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is None:
+                        stop = True
+                        break
+                    batch.append(entry)
+                try:
+                    if history_fd is not None and not _fd_is_current(history_fd, self.history_file):
+                        os.close(history_fd)
+                        history_fd = None
+                    if history_fd is None:
+                        self._rotate_history_file()
+                        history_fd = os.open(self.history_file,
+                                             os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    data = b''.join(_json_line(e) for e in batch)
+                    while data:
+                        data = data[os.write(history_fd, data):]
+                except Exception as e:
+                    logger.warning(f"Failed to save history: {e}")
+                if stop:
+                    return
+        finally:
+            if history_fd is not None:
+                os.close(history_fd)
+    
+    def _rotate_history_file(self):
+        """Cut an oversized history file back to its newest entries."""
+        try:
+            size = self.history_file.stat().st_size
+        except OSError:
+            return
+        if size <= _HISTORY_ROTATE_BYTES:
+            return
+        with open(self.history_file, 'rb') as f:
+            lines = _read_tail_lines(f, size, _HISTORY_ROTATE_KEEP)
+        # Replace atomically so a concurrent reader never sees a partial file
+        tmp_file = self.history_file.with_suffix(f'.jsonl.{os.getpid()}.tmp')
+        tmp_file.write_bytes(b''.join(line + b'\n' for line in lines))
+        os.replace(tmp_file, self.history_file)
+    
+    def _flush_history(self):
+        """Wait for queued history entries to be written (runs at exit)."""
+        if self._save_thread is not None and self._save_thread.is_alive():
+            self._save_queue.put(None)
+            self._save_thread.join(timeout=2)
+    
+    def _recent_history(self, count: int) -> List[Dict[str, Any]]:
+        """Get the last count history entries, oldest first."""
+        recent = list(islice(reversed(self.command_history), count))
+        recent.reverse()
+        return recent
     
-    def _detect_project_context(self) -> Dict[str, Any]:
+    def _index_similar(self, command: str, base: str):
+        """Record command under its program name for similar-command lookup."""
+        recent = self._similar_index.get(base)
+        if recent is None:
+            recent = self._similar_index[base] = deque(maxlen=5)
+        recent.append((self._history_seq, command))
+        self._history_seq += 1
+    
+    def _remember_prefix(self, entry: Dict[str, Any]):
+        """Add a history entry to the prefix cache if it is safe to replay.
+        
+        Entries are scoped to the directory they were recorded in, since the
+        same prefix can complete differently in another project, and keep the
+        git branch and time they were recorded at for _lookup_prefix_cache.
+        """
+        context = entry.get('context') or {}
+        command = entry.get('command', '')
+        completion = entry.get('completion', '')
+        if context.get('source') not in _PREFIX_CACHE_SOURCES or not command or not completion:
+            return
+        try:
+            saved_at = datetime.fromisoformat(entry['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return
+        key = _normalize_command(command)
+        if key and _normalize_command(completion).startswith(key):
+            self._prefix_cache[(entry.get('working_dir'), key)] = (
+                completion, context.get('git_branch'), saved_at)
+    
+    def _lookup_prefix_cache(self, command: str, cwd: str) -> Optional[str]:
+        """Return a completion recorded in cwd whose prefix covers most of command.
+        
+        Walks prefixes of the normalized command from longest to shortest, so the
+        cost is a handful of dict lookups rather than a model round-trip.
+        Completions older than _PREFIX_CACHE_TTL, or recorded on a different git
+        branch than the current one, are not replayed.
+        """
+        norm = _normalize_command(command)
+        min_len = len(norm) * _PREFIX_CACHE_MIN_COVERAGE
+        oldest = time.time() - _PREFIX_CACHE_TTL
+        for end in range(len(norm), 0, -1):
+            if end < min_len:
+                break
+            cached = self._prefix_cache.get((cwd, norm[:end]))
+            if cached is None:
+                continue
+            completion, branch, saved_at = cached
+            completion_norm = _normalize_command(completion)
+            if (saved_at >= oldest and len(completion_norm) > len(norm) and
+                    completion_norm.startswith(norm)):
+                # Only looked up when it matters: a git status per hit
+                if branch is None or branch == self._current_git_branch():
+                    return completion
+        return None
+    
+    def _current_git_branch(self) -> Optional[str]:
+        """Get the checked-out branch, or None outside a repository or when detached."""
+        state = self._get_git_state()
+        return (state[0] or None) if state else None
+    
+    def _get_project_context(self, cwd: Optional[str] = None) -> 'ProjectContext':
+        """Get project context, re-detecting only when the directory changes.
+        
+        Keyed on the working directory and its mtime, which changes whenever a
+        file is added, removed or renamed in it.
+        """
+        if cwd is None:
+            cwd = os.getcwd()
+        try:
+            key = (cwd, os.stat(cwd).st_mtime_ns)
+        except OSError:
+            return self._detect_project_context(cwd)
+        context = self._ctx_cache.pop(key, None)
+        if context is None:
+            context = self._detect_project_context(cwd)
+            if len(self._ctx_cache) >= _CTX_CACHE_MAX_ENTRIES:
+                # Drop the least recently used directory
+                del self._ctx_cache[next(iter(self._ctx_cache))]
+        # Re-inserted so the dict stays in least- to most-recently-used order
+        self._ctx_cache[key] = context
+        # Callers set per-call fields (e.g. git counts), so hand out a copy
+        return context.copy()
+    
+    def _detect_project_context(self, cwd: Optional[str] = None) -> 'ProjectContext':
         """Detect project type and context."""
-        context = {
-            'project_type': 'unknown',
-            'languages': [],
-            'frameworks': [],
-            'has_docker': False,
-            'has_k8s': False,
-            'has_python': False,
-            'has_node': False,
-            'files': []
-        }
+        context = ProjectContext()
         
-        current_dir = Path(os.getcwd())
+        current_dir = cwd or os.getcwd()
+        
+        # One directory read instead of a stat per candidate file
+        names = set()
+        files = []
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    names.add(entry.name)
+                    if len(files) > _MAX_RECENT_FILE_SCAN:
+                        continue
+                    try:
+                        if entry.is_file():
+                            files.append(entry)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
         
         # Check for project files
-        if (current_dir / 'package.json').exists():
-            context['project_type'] = 'node'
-            context['has_node'] = True
-            try:
-                with open(current_dir / 'package.json') as f:
-                    pkg = json.load(f)
-                    if 'dependencies' in pkg or 'devDependencies' in pkg:
-                        deps = {**pkg.get('dependencies', {}), **pkg.get('devDependencies', {})}
-                        if 'react' in deps:
-                            context['frameworks'].append('react')
-                        if 'vue' in deps:
-                            context['frameworks'].append('vue')
-                        if 'express' in deps:
-                            context['frameworks'].append('express')
-            except:
-                pass
+        if 'package.json' in names:
+            context.project_type = 'node'
+            context.has_node = True
+            context.frameworks.extend(
+                self._package_frameworks(os.path.join(current_dir, 'package.json')))
         
-        if (current_dir / 'requirements.txt').exists() or (current_dir / 'pyproject.toml').exists() or (current_dir / 'setup.py').exists():
-            context['project_type'] = 'python'
-            context['has_python'] = True
-            context['languages'].append('python')
+        if 'requirements.txt' in names or 'pyproject.toml' in names or 'setup.py' in names:
+            context.project_type = 'python'
+            context.has_python = True
+            context.languages.append('python')
         
-        if (current_dir / 'Dockerfile').exists() or (current_dir / 'docker-compose.yml').exists():
-            context['has_docker'] = True
+        if 'Dockerfile' in names or 'docker-compose.yml' in names:
+            context.has_docker = True
         
-        if (current_dir / 'k8s').exists() or (current_dir / 'kubernetes').exists() or list(current_dir.glob('*.yaml')):
-            context['has_k8s'] = True
+        if 'k8s' in names or 'kubernetes' in names or any(name.endswith('.yaml') for name in names):
+            context.has_k8s = True
         
-        if (current_dir / 'pom.xml').exists() or (current_dir / 'build.gradle').exists():
-            context['project_type'] = 'java'
-            context['languages'].append('java')
+        if 'pom.xml' in names or 'build.gradle' in names:
+            context.project_type = 'java'
+            context.languages.append('java')
         
-        if (current_dir / 'Cargo.toml').exists():
-            context['project_type'] = 'rust'
-            context['languages'].append('rust')
+        if 'Cargo.toml' in names:
+            context.project_type = 'rust'
+            context.languages.append('rust')
         
-        if (current_dir / 'go.mod').exists():
-            context['project_type'] = 'go'
-            context['languages'].append('go')
+        if 'go.mod' in names:
+            context.project_type = 'go'
+            context.languages.append('go')
         
         # Get recent files
+        if len(files) > _MAX_RECENT_FILE_SCAN:
+            files = []
         try:
-            recent_files = sorted(
-                [f for f in current_dir.iterdir() if f.is_file()],
-                key=lambda x: x.stat().st_mtime,
-                reverse=True
-            )[:10]
-            context['files'] = [f.name for f in recent_files]
+            # Top 10 by mtime without sorting the whole directory
+            recent_files = heapq.nlargest(10, files, key=lambda x: x.stat().st_mtime)
+            context.files = [f.name for f in recent_files]
         except:
             pass
         
         return context
     
-    def _get_user_patterns(self, command: str) -> Dict[str, Any]:
-        """Analyze user patterns from history."""
+    def _package_frameworks(self, path: str) -> List[str]:
+        """Frameworks a package.json depends on, re-read only when it changes.
+        
+        The project context cache misses whenever any file in the directory
+        is added or removed; this keeps those misses from re-parsing an
+        unchanged package.json.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return []
+        cached = self._pkg_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        frameworks = []
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            # Only parse when a framework name appears at all, which most
+            # package.json files can rule out with a plain bytes scan
+            if any(name in raw for name in _FRAMEWORK_KEYS):
+                pkg = _json_loads(raw)
+                if 'dependencies' in pkg or 'devDependencies' in pkg:
+                    deps = {**pkg.get('dependencies', {}), **pkg.get('devDependencies', {})}
+                    if 'react' in deps:
+                        frameworks.append('react')
+                    if 'vue' in deps:
+                        frameworks.append('vue')
+                    if 'express' in deps:
+                        frameworks.append('express')
+        except:
+            pass
+        
+        if len(self._pkg_cache) >= _CTX_CACHE_MAX_ENTRIES:
+            del self._pkg_cache[next(iter(self._pkg_cache))]
+        self._pkg_cache[path] = (mtime, frameworks)
+        return frameworks
+    
+    def _get_user_patterns(self, command: str, base: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze user patterns from history; base is the command's program
+        name when the caller has already split it out."""
+        if base is None:
+            base = _command_base(command)
         patterns = {
             'frequent_commands': [],
             'common_flags': [],
@@ -140,46 +827,43 @@ class EnhancedCompleter(ModelCompleter):
             'similar_commands': []
         }
         
-        # Find similar commands in history
-        cmd_base = command.split()[0] if command.split() else command
-        similar = [
-            h['command'] for h in self.command_history[-50:]
-            if h['command'].split()[0] == cmd_base
+        # Find similar commands among the last 50 history entries
+        window_start = self._history_seq - 50
+        patterns['similar_commands'] = [
+            cmd for seq, cmd in self._similar_index.get(base, ())
+            if seq >= window_start
         ]
-        patterns['similar_commands'] = similar[-5:]
         
         # Get frequent commands
-        all_commands = [h['command'].split()[0] for h in self.command_history[-100:]]
-        counter = Counter(all_commands)
-        patterns['frequent_commands'] = [cmd for cmd, _ in counter.most_common(5)]
+        patterns['frequent_commands'] = [cmd for cmd, _ in self._base_counts.most_common(5)]
         
         # Get recent workflow (sequence of commands)
         if len(self.command_history) >= 2:
             patterns['recent_workflow'] = [
-                h['command'] for h in self.command_history[-3:]
+                h['command'] for h in self._recent_history(3)
             ]
         
         return patterns
     
-    def _build_enhanced_prompt(self, command: str) -> str:
+    def _build_enhanced_prompt(self, command: str, base: Optional[str] = None) -> str:
         """Build enhanced prompt with developer context and command sequences."""
-        current_dir = os.getcwd()
-        dir_name = os.path.basename(current_dir)
+        if base is None:
+            base = _command_base(command)
+        # Run the git subprocess in the background while patterns are computed
+        git_future = _EXECUTOR.submit(self._get_git_state)
         
-        # Get git info
-        git_info = self._get_git_info()
+        # Get user patterns
+        patterns = self._get_user_patterns(command, base)
+        
+        # Get git info, already split into branch and status
+        git_state = git_future.result()
         git_branch = ""
         git_status = ""
-        if git_info:
-            lines = git_info.split('\n')
-            for line in lines:
-                if 'Branch:' in line:
-                    git_branch = line.split('Branch:')[1].strip()
-                if 'Status:' in line:
-                    git_status = line.split('Status:')[1].strip()
-        
-        # Get user patterns
-        patterns = self._get_user_patterns(command)
+        if git_state is not None:
+            git_branch = git_state[0]
+            # Only the first status line is consulted below
+            git_status = git_state[1].split('\n', 1)[0].strip()
+        self._git_branch = git_branch or None
         
         # Get recent command history for sequence awareness
         # Since CLI creates new instance each time, we rely on persisted history
@@ -188,12 +872,13 @@ class EnhancedCompleter(ModelCompleter):
         # First try in-memory history (same session - works if completer is reused)
         if self.history and len(self.history) > 1:
             # Get last 3 commands before current one
-            recent_commands = self.history[-4:-1] if len(self.history) > 4 else self.history[:-1]
+            history = list(self.history)
+            recent_commands = history[-4:-1] if len(history) > 4 else history[:-1]
         
         # Check persisted history for recent commands (including completions that were executed)
         if not recent_commands and self.command_history:
             # Look at the last few commands/completions - use the completion as that's what was actually executed
-            recent_entries = self.command_history[-5:]
+            recent_entries = self._recent_history(5)
             # Get actual executed commands (use completion if it's a full command)
             executed_commands = []
             for entry in recent_entries:
@@ -209,13 +894,16 @@ class EnhancedCompleter(ModelCompleter):
         context_parts = []
         
         # Project context
-        if self.project_context['project_type'] != 'unknown':
-            context_parts.append(f"Project: {self.project_context['project_type']}")
-        if self.project_context['frameworks']:
-            context_parts.append(f"Frameworks: {', '.join(self.project_context['frameworks'])}")
-        if self.project_context['has_docker']:
+        ctx = self.project_context
+        project_type = ctx.project_type
+        if project_type != 'unknown':
+            context_parts.append(f"Project: {project_type}")
+        frameworks = ctx.frameworks
+        if frameworks:
+            context_parts.append(f"Frameworks: {', '.join(frameworks)}")
+        if ctx.has_docker:
             context_parts.append("Has Docker")
-        if self.project_context['has_k8s']:
+        if ctx.has_k8s:
             context_parts.append("Has Kubernetes")
         
         # Git context
@@ -226,20 +914,24 @@ class EnhancedCompleter(ModelCompleter):
         
         # Add detailed git status for "git" command (informational only, let AI decide)
         if command.strip() == "git":
-            if self.project_context.get('git_unstaged', 0) > 0:
-                context_parts.append(f"Has {self.project_context.get('git_unstaged')} unstaged file(s)")
-            if self.project_context.get('git_staged', 0) > 0:
-                context_parts.append(f"Has {self.project_context.get('git_staged')} staged file(s)")
-            if self.project_context.get('git_unstaged', 0) == 0 and self.project_context.get('git_staged', 0) == 0:
+            git_unstaged = ctx.git_unstaged
+            git_staged = ctx.git_staged
+            if git_unstaged > 0:
+                context_parts.append(f"Has {git_unstaged} unstaged file(s)")
+            if git_staged > 0:
+                context_parts.append(f"Has {git_staged} staged file(s)")
+            if git_unstaged == 0 and git_staged == 0:
                 context_parts.append("No uncommitted changes")
         
         # User patterns
-        if patterns['similar_commands']:
-            context_parts.append(f"Recent similar: {patterns['similar_commands'][-1]}")
+        similar_commands = patterns['similar_commands']
+        if similar_commands:
+            context_parts.append(f"Recent similar: {similar_commands[-1]}")
         
         # Recent files
-        if self.project_context['files']:
-            recent_files = ', '.join(self.project_context['files'][:3])
+        files = ctx.files
+        if files:
+            recent_files = ', '.join(files[:3])
             context_parts.append(f"Recent files: {recent_files}")
         
         context_str = " | ".join(context_parts)
@@ -260,7 +952,7 @@ class EnhancedCompleter(ModelCompleter):
             prompt_parts.append(f"\nContext: {context_str}")
         
         # Add personalization hint
-        if patterns['frequent_commands'] and command.split()[0] in patterns['frequent_commands']:
+        if patterns['frequent_commands'] and base in patterns['frequent_commands']:
             prompt_parts.append("\n(User frequently uses this command type)")
         
         prompt = "\n".join(prompt_parts)
@@ -270,103 +962,6 @@ class EnhancedCompleter(ModelCompleter):
         
         return prompt
     
-    def get_completion(self, command: str, use_cache: bool = True) -> str:
-        """Get enhanced completion with developer context."""
-        # Update history
-        if command and (not self.history or self.history[-1] != command):
-            self.history.append(command)
-            self.history = self.history[-10:]
-        
-        # Refresh project context
-        self.project_context = self._detect_project_context()
-        
-        # Try AI completion with enhanced prompt (with fast timeout)
-        # For interactive use, prioritize speed over AI quality
-        # Try training data first for instant results
-        fallback_completion = self._get_fallback_completion(command)
-        
-        # Try AI only if no training data match, with very short timeout
-        if not fallback_completion:
-            try:
-                prompt = self._build_enhanced_prompt(command)
-                
-                # Use very short timeout for interactive use (3 seconds)
-                original_timeout = self.client.timeout
-                self.client.timeout = 3
-                
-                try:
-                    completion = self.client.generate_completion(
-                        prompt, self.model, use_cache=use_cache
-                    )
-                except Exception:
-                    # Timeout or error - return None to use fallback
-                    completion = None
-                finally:
-                    self.client.timeout = original_timeout
-            except Exception:
-                completion = None
-        else:
-            # Use training data immediately
-            self._save_command(command, fallback_completion, {
-                'project_type': self.project_context['project_type'],
-                'source': 'training_data'
-            })
-            return fallback_completion
-        
-        # If we got an AI completion, process it
-        if completion:
-            try:
-                # Extract the completion from the response
-                lines = completion.strip().split('\n')
-                for line in lines:
-                    line = line.strip()
-                    # Clean markdown
-                    line = line.replace('```', '').strip()
-                    
-                    # Look for lines that look like actual commands
-                    if (line and 
-                        len(line) > len(command) and
-                        ' ' in line and
-                        not line.startswith(('To complete', 'This will', 'You can', 'Enter', 'Run:', 'Note:', 'Environment:', 'User:', 'Host:', 'Directory:', 'Recent:', 'Replace', 'This will launch', 'You can now', 'This will display', 'Suggestion:', 'Implement:', 'Provide', 'Git commit is', 'Remember,', 'By following', 'Start by', 'Next,', 'After that', 'The command', 'You are a', 'Complete the command', 'Command to complete', 'Sure,', 'Here', 'This flag', 'This option', 'This command', 'Context:', 'Project:', 'Git branch:', 'Recent files:', 'User frequently')) and
-                        not line.startswith(('1.', '2.', '3.', '4.', '5.', '- ', '* ', '• ')) and
-                        not line.endswith(':') and
-                        not line.startswith('$') and
-                        not line.startswith('`') and
-                        not line.endswith('`') and
-                        '|' not in line[:20]):  # Skip context lines
-                        result = line
-                        
-                        # Save to history
-                        git_info = self._get_git_info()
-                        git_branch = None
-                        if git_info and 'Branch:' in git_info:
-                            try:
-                                git_branch = git_info.split('Branch:')[1].strip().split('\n')[0]
-                            except:
-                                pass
-                        
-                        self._save_command(command, result, {
-                            'project_type': self.project_context['project_type'],
-                            'git_branch': git_branch,
-                            'source': 'ai'
-                        })
-                        return result
-            except Exception as e:
-                logger.warning(f"AI completion processing failed: {e}")
-        
-        # Fall back to training data (already checked above, but check again in case)
-        fallback_completion = self._get_fallback_completion(command)
-        if fallback_completion:
-            # Save to history even for fallbacks
-            self._save_command(command, fallback_completion, {
-                'project_type': self.project_context['project_type'],
-                'source': 'training_data'
-            })
-            return fallback_completion
-        
-        # Return original command if no completion found
-        return command
-    
     def get_personalized_suggestions(self, command: str, max_suggestions: int = 5) -> List[str]:
         """Get personalized suggestions based on user history."""
         suggestions = []
@@ -395,22 +990,17 @@ class EnhancedCompleter(ModelCompleter):
     def _get_git_diff_context(self) -> str:
         """Get git diff content to understand actual code changes."""
         try:
-            # Try staged changes first
-            diff_result = subprocess.run(['git', 'diff', '--cached'],
-                                       capture_output=True, text=True, timeout=5)
-            diff_content = diff_result.stdout if diff_result.returncode == 0 else ""
+            # Try staged changes first; only the lines scanned below are read
+            lines = _git_head_lines(['git', 'diff', '--cached'], 500, timeout=5)
             
             # If no staged changes, check unstaged
-            if not diff_content.strip():
-                diff_result = subprocess.run(['git', 'diff'],
-                                           capture_output=True, text=True, timeout=5)
-                diff_content = diff_result.stdout if diff_result.returncode == 0 else ""
+            if not any(line.strip() for line in lines):
+                lines = _git_head_lines(['git', 'diff'], 500, timeout=5)
             
-            if not diff_content:
+            if not lines:
                 return ""
             
             # Extract meaningful functionality from diff
-            lines = diff_content.split('\n')
             key_changes = {
                 'functions': [],
                 'classes': [],
@@ -501,7 +1091,7 @@ class EnhancedCompleter(ModelCompleter):
                                 method_name = method_match.split('.')[-1].strip()
                                 obj_name = method_match.split('.')[0].strip()
                                 # More specific method extraction
-                                if any(keyword in method_name.lower() for keyword in ['generate', 'create', 'process', 'handle', 'analyze', 'extract', 'parse', 'build', 'setup', 'init', 'train', 'complete', 'fix', 'add', 'implement', 'improve', 'enhance', 'refactor', 'update', 'delete', 'remove', 'save', 'load', 'get', 'set', 'send', 'receive', 'validate', 'check', 'verify']):
+                                if _DIFF_METHOD_WORDS_RE.search(method_name):
                                     # Extract parameters if meaningful
                                     if '(' in stripped and ')' in stripped:
                                         params = stripped.split('(')[1].split(')')[0]
@@ -524,8 +1114,7 @@ class EnhancedCompleter(ModelCompleter):
                             left = stripped.split('=')[0].strip()
                             right = stripped.split('=')[1].strip().split('#')[0].strip()
                             # Look for meaningful variable names or operations
-                            meaningful_vars = ['result', 'output', 'data', 'config', 'model', 'client', 'handler', 'manager', 'service', 'api', 'response', 'request', 'error', 'exception', 'value', 'item', 'obj', 'instance', 'completion', 'prediction', 'message', 'commit', 'diff', 'context', 'prompt', 'feature', 'functionality']
-                            if any(keyword in left.lower() for keyword in meaningful_vars):
+                            if _DIFF_ASSIGN_WORDS_RE.search(left):
                                 if len(right) < 100 and '/' not in right and not any(ext in right for ext in ['.py', '.js', '.log', '.txt']):
                                     # Clean up right side
                                     if right.startswith(('f"', "f'", '"', "'")):
@@ -536,7 +1125,7 @@ class EnhancedCompleter(ModelCompleter):
                         elif stripped.startswith(('if ', 'elif ', 'while ', 'for ')) and len(stripped) > 15:
                             condition = stripped.split(':')[0] if ':' in stripped else stripped
                             # Extract meaningful condition
-                            if any(keyword in condition.lower() for keyword in ['error', 'exception', 'none', 'empty', 'valid', 'check', 'verify', 'exists', 'available', 'found']):
+                            if _DIFF_CONDITION_WORDS_RE.search(condition):
                                 key_changes['features'].append(f"condition: {condition[:80]}")
             
             # Build descriptive context (functionality only, no file names)
@@ -547,12 +1136,11 @@ class EnhancedCompleter(ModelCompleter):
                 # Filter out file-related features, duplicates, and generic code fragments
                 features = []
                 seen = set()
-                generic_patterns = ['function_context', 'key_changes', 'seen.add', 'capture_output', 'diff_result', 'prompt_parts', 'context_parts', 'if diff_result', 'if len(', 'if not ', 'if any(', 'if stripped', 'for f in', 'for line in', 'for imp in', 'parts =', 'line =', 'f_lower =', 'module =']
                 
                 for f in key_changes['features']:
                     f_lower = f.lower()
                     # Skip if it's a generic code fragment
-                    is_generic = any(pattern in f_lower for pattern in generic_patterns)
+                    is_generic = _DIFF_GENERIC_FEATURE_RE.search(f_lower) is not None
                     # Skip if it's just a variable assignment without meaning
                     is_just_assignment = '=' in f and len(f.split('=')) == 2 and len(f.split('=')[0].strip()) < 15
                     
@@ -614,117 +1202,63 @@ class EnhancedCompleter(ModelCompleter):
         }
         
         try:
-            # Check if we're in a git repo
-            subprocess.run(['git', 'rev-parse', '--is-inside-work-tree'], 
-                         check=True, capture_output=True, text=True, timeout=2)
-            
-            # Get both staged and unstaged changes
-            status_result = subprocess.run(['git', 'status', '--short'],
-                                         capture_output=True, text=True, timeout=2)
-            status_output = status_result.stdout.strip()
-            
-            # Also check unstaged changes
-            diff_unstaged = subprocess.run(['git', 'diff', '--name-only'],
-                                          capture_output=True, text=True, timeout=2)
-            unstaged_files = [f.strip() for f in diff_unstaged.stdout.strip().split('\n') if f.strip()]
-            
-            # Also check staged changes specifically
-            diff_staged = subprocess.run(['git', 'diff', '--cached', '--name-only'],
-                                       capture_output=True, text=True, timeout=2)
-            staged_files = [f.strip() for f in diff_staged.stdout.strip().split('\n') if f.strip()]
+            # Get both staged and unstaged changes (raw bytes; decoded only where
+            # file names are actually recorded). The three calls are independent,
+            # so they run concurrently; --numstat lists one "added<TAB>removed<TAB>path"
+            # line per file, giving the file lists and line counts in one go.
+            # Outside a repository they fail, which replaces a rev-parse check.
+            status_output, unstaged_numstat, staged_numstat = _run_git_concurrently([
+                ['git', 'status', '--porcelain=v2', '-z'],
+                ['git', 'diff', '--numstat'],
+                ['git', 'diff', '--cached', '--numstat'],
+            ], timeout=2)
+            entries = _parse_status_v2(status_output)
+            unstaged_files = unstaged_numstat.splitlines()
+            staged_files = staged_numstat.splitlines()
             
             # Use staged changes if available, otherwise use unstaged
-            if not status_output and not unstaged_files and not staged_files:
+            if not entries and not unstaged_files and not staged_files:
                 return changes
             
             # Prefer staged changes for commit message generation (for commits, we want staged)
-            # If no staged changes, use unstaged
+            # If no staged changes, use unstaged. The status entries carry both the
+            # staged (X) and unstaged (Y) state, so no separate --name-status call.
             if staged_files:
-                # Get detailed status of staged files
-                status_staged = subprocess.run(['git', 'diff', '--cached', '--name-status'],
-                                             capture_output=True, text=True, timeout=2)
-                if status_staged.returncode == 0:
-                    for line in status_staged.stdout.strip().split('\n'):
-                        if not line.strip():
-                            continue
-                        status = line[0]
-                        filename = line[1:].strip()
-                        if filename not in changes['files_changed']:
-                            if status == 'A':
-                                changes['files_added'].append(filename)
-                            elif status == 'D':
-                                changes['files_deleted'].append(filename)
-                            else:  # M, R, etc
-                                changes['files_modified'].append(filename)
-                            changes['files_changed'].append(filename)
+                column = 0
             elif unstaged_files:
-                # No staged changes, but have unstaged - analyze those
-                status_unstaged = subprocess.run(['git', 'diff', '--name-status'],
-                                               capture_output=True, text=True, timeout=2)
-                if status_unstaged.returncode == 0:
-                    for line in status_unstaged.stdout.strip().split('\n'):
-                        if not line.strip():
-                            continue
-                        status = line[0]
-                        filename = line[1:].strip()
-                        if filename not in changes['files_changed']:
-                            if status == 'A':
-                                changes['files_added'].append(filename)
-                            elif status == 'D':
-                                changes['files_deleted'].append(filename)
-                            else:  # M, R, etc
-                                changes['files_modified'].append(filename)
-                            changes['files_changed'].append(filename)
+                column = 1
             else:
-                # Fallback to parsing status output
-                for line in status_output.split('\n'):
-                    if not line.strip():
+                column = None
+            for xy, filename in entries:
+                if column is None:
+                    # Nothing in either diff (e.g. only untracked files)
+                    status = xy[0]
+                    if status == 'A':
+                        changes['files_added'].append(filename)
+                    elif status == 'D':
+                        changes['files_deleted'].append(filename)
+                    elif status in 'MR':
+                        changes['files_modified'].append(filename)
+                else:
+                    status = xy[column]
+                    # Unchanged on this side, or untracked (never in a diff)
+                    if status in '.?':
                         continue
-                    
-                    status = line[:2]
-                    filename = line[3:].strip()
-                    
-                    if filename not in changes['files_changed']:
-                        if status.startswith('A'):
-                            changes['files_added'].append(filename)
-                        elif status.startswith('D'):
-                            changes['files_deleted'].append(filename)
-                        elif status.startswith('M') or status.startswith('R'):
-                            changes['files_modified'].append(filename)
-                        
-                        changes['files_changed'].append(filename)
-            
-            # Get diff stats (try staged first, then unstaged)
-            diff_result = subprocess.run(['git', 'diff', '--cached', '--stat'],
-                                        capture_output=True, text=True, timeout=3)
-            diff_output = diff_result.stdout if diff_result.returncode == 0 else ""
-            
-            # If no staged changes, check unstaged
-            if not diff_output.strip():
-                diff_result = subprocess.run(['git', 'diff', '--stat'],
-                                            capture_output=True, text=True, timeout=3)
-                diff_output = diff_result.stdout if diff_result.returncode == 0 else ""
+                    if status == 'A':
+                        changes['files_added'].append(filename)
+                    elif status == 'D':
+                        changes['files_deleted'].append(filename)
+                    else:  # M, R, etc
+                        changes['files_modified'].append(filename)
+                changes['files_changed'].append(filename)
             
-            if diff_output:
-                # Extract line counts from diff stat
-                for line in diff_output.split('\n'):
-                    if '|' in line and ('file changed' in line.lower() or 'files changed' in line.lower()):
-                        # Extract numbers from stat line
-                        parts = line.split('|')
-                        if len(parts) >= 2:
-                            numbers = parts[1].strip().split(',')
-                            for num in numbers:
-                                num = num.strip()
-                                if '+' in num:
-                                    try:
-                                        changes['lines_added'] += int(num.replace('+', '').split()[0])
-                                    except:
-                                        pass
-                                elif '-' in num:
-                                    try:
-                                        changes['lines_removed'] += int(num.replace('-', '').split()[0])
-                                    except:
-                                        pass
+            # Get diff stats (staged first, then unstaged); binary files show "-"
+            for line in staged_files or unstaged_files:
+                added, removed, _ = line.split(b'\t', 2)
+                if added.isdigit():
+                    changes['lines_added'] += int(added)
+                if removed.isdigit():
+                    changes['lines_removed'] += int(removed)
             
             # Generate concise summary
             summary_parts = []
@@ -759,6 +1293,12 @@ class EnhancedCompleter(ModelCompleter):
         if not changes['files_changed']:
             return 'WIP'
         
+        # Docs/tests/CI-only changes need no diff reading or model round-trip
+        quick_message = _heuristic_commit_message(changes)
+        if quick_message:
+            logger.debug(f"Heuristic commit message: {quick_message}")
+            return quick_message
+        
         # Build context for AI (functionality only, no file names)
         context_parts = []
         
@@ -779,22 +1319,6 @@ class EnhancedCompleter(ModelCompleter):
         # Get actual diff content to understand functionality
         diff_context = self._get_git_diff_context()
         
-        # Determine likely commit type from changes and diff
-        commit_type_hint = "chore"
-        diff_lower = diff_context.lower()
-        files_lower = ' '.join(changes['files_changed']).lower()
-        
-        if changes['files_added'] or 'add' in diff_lower or 'new' in diff_lower or 'implement' in diff_lower:
-            commit_type_hint = "feat"
-        elif any(word in files_lower or word in diff_lower for word in ['fix', 'bug', 'error', 'issue', 'resolve', 'repair']):
-            commit_type_hint = "fix"
-        elif any(word in diff_lower for word in ['test', 'spec', 'expect']):
-            commit_type_hint = "test"
-        elif any(word in files_lower or word in diff_lower for word in ['doc', 'readme', '.md']):
-            commit_type_hint = "docs"
-        elif any(word in diff_lower for word in ['refactor', 'simplify', 'clean', 'restructure']):
-            commit_type_hint = "refactor"
-        
         # Build descriptive prompt - focus on functionality, not files
         prompt_parts = []
         
@@ -813,24 +1337,14 @@ class EnhancedCompleter(ModelCompleter):
         # If we have no context, try to get raw diff for analysis (both staged and unstaged)
         if not prompt_parts:
             try:
-                # Try staged first
-                diff_result = subprocess.run(['git', 'diff', '--cached', '-U3'],
-                                           capture_output=True, text=True, timeout=3)
-                if diff_result.returncode == 0 and diff_result.stdout:
-                    raw_diff = diff_result.stdout
-                else:
-                    # Try unstaged if no staged changes
-                    diff_result = subprocess.run(['git', 'diff', '-U3'],
-                                               capture_output=True, text=True, timeout=3)
-                    if diff_result.returncode == 0 and diff_result.stdout:
-                        raw_diff = diff_result.stdout
-                    else:
-                        raw_diff = None
+                # Try staged first, then unstaged if no staged changes
+                diff_lines = (_git_head_lines(['git', 'diff', '--cached', '-U3'], 300, timeout=3) or
+                              _git_head_lines(['git', 'diff', '-U3'], 300, timeout=3))
                 
-                if raw_diff:
+                if diff_lines:
                     # Extract just the code changes (skip file headers)
                     code_lines = []
-                    for line in raw_diff.split('\n')[:300]:  # Increased limit
+                    for line in diff_lines:
                         if line.startswith('+') and not line.startswith('+++') and not line.startswith('+@@'):
                             code = line[1:].strip()
                             if code and not code.startswith('#') and len(code) > 3:  # Reduced from 5 to 3
@@ -882,123 +1396,25 @@ If the changes are about functionality extraction, write: "feat: enhance diff an
 Write ONLY the commit message:"""
         
         try:
-            # Use longer timeout for commit message generation (needs more time for quality)
-            original_timeout = self.client.timeout
-            self.client.timeout = 20  # Increased timeout for commit message generation
-            
-            try:
-                # Ensure we use the fine-tuned model
-                available_models = self.client.get_available_models()
-                zsh_model = None
-                for model in available_models:
-                    if model.startswith("zsh-assistant"):
-                        zsh_model = model
-                        break
-                model_to_use = zsh_model if zsh_model else self.model
-                logger.debug(f"Using model: {model_to_use} for commit message generation")
-                logger.debug(f"Prompt length: {len(prompt)} characters")
-                completion = self.client.generate_completion(
-                    prompt, model_to_use, use_cache=False
-                )
-                logger.debug(f"Raw completion: {completion[:200]}")
-            finally:
-                self.client.timeout = original_timeout
-            
-            # Extract commit message - clean and parse AI response
-            import re
-            completion_text = completion.strip()
-            
-            # Remove common prefixes
-            completion_text = re.sub(r'^(Input|Output|input|output):\s*', '', completion_text, flags=re.IGNORECASE)
+            # Ensure we use the fine-tuned model
+            available_models = self.client.get_available_models()
+            zsh_model = None
+            for model in available_models:
+                if model.startswith("zsh-assistant"):
+                    zsh_model = model
+                    break
+            model_to_use = zsh_model if zsh_model else self.model
+            logger.debug(f"Using model: {model_to_use} for commit message generation")
+            logger.debug(f"Prompt length: {len(prompt)} characters")
             
-            # Split into lines and process
-            lines = completion_text.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # Remove markdown formatting
-                line = line.replace('```', '').replace('`', '').strip()
-                
-                # Remove "Conventional Commit Message:" labels
-                line = re.sub(r'^\s*Conventional Commit Message:\s*', '', line, flags=re.IGNORECASE)
-                line = re.sub(r'^\s*Commit Message:\s*', '', line, flags=re.IGNORECASE)
-                
-                # Skip explanatory lines
-                if (line.startswith(('Generate', 'Format:', 'Examples:', 'Changes:', 'Project:', 'File types:', 'Here', 'Sure', 'This')) or
-                    line.startswith(('1.', '2.', '3.', '- ', '* ', '•')) or
-                    len(line) < 5):
-                    continue
-                
-                # Look for commit message format (type: subject)
-                if ':' in line[:80]:
-                    line = line.strip()
-                    line = re.sub(r'\s*\([^)]*\)\s*$', '', line)
-                    line = re.sub(r'\s*\(Added by[^)]*\)', '', line)
-                    if len(line) > 8 and line.count(':') >= 1:
-                        if ':' in line:
-                            parts = line.split(':', 1)
-                            commit_type = parts[0].strip().lower()
-                            subject = parts[1].strip() if len(parts) > 1 else ""
-                            
-                            # Reject generic messages
-                            subject_lower = subject.lower().strip()
-                            generic_patterns = [
-                                'add new functionality', 'enhance functionality', 'improve functionality',
-                                'update functionality', 'add functionality', 'enhance completion functionality',
-                                'improve code', 'update code', 'add feature', 'new feature', 'update feature',
-                                'enhance completion', 'improve completion', 'update completion'
-                            ]
-                            if any(pattern in subject_lower for pattern in generic_patterns):
-                                logger.warning(f"Rejected generic commit message: {subject}")
-                                continue  # Skip this message and try next line
-                            
-                            # Validate commit type
-                            valid_types = ['feat', 'fix', 'refactor', 'docs', 'test', 'chore', 'perf', 'style', 'build', 'ci']
-                            if commit_type not in valid_types:
-                                # Try to infer from subject
-                                subject_lower = subject.lower()
-                                if any(word in subject_lower for word in ['add', 'new', 'feature', 'implement', 'create']):
-                                    commit_type = "feat"
-                                elif any(word in subject_lower for word in ['fix', 'bug', 'error', 'issue', 'resolve']):
-                                    commit_type = "fix"
-                                elif any(word in subject_lower for word in ['refactor', 'simplify', 'restructure']):
-                                    commit_type = "refactor"
-                                else:
-                                    commit_type = "feat"  # Default to feat if seems like new functionality
-                            
-                            # Clean subject - remove quotes, extra spaces
-                            subject = subject.strip('"').strip("'").strip()
-                            
-                            # Validate subject has meaningful content
-                            if len(subject) >= 5:
-                                # Reject generic messages
-                                subject_lower = subject.lower().strip()
-                                rejected_exact = ['message', 'commit message', 'commit']
-                                # Check for generic patterns (both exact and partial matches)
-                                generic_keywords = ['enhance functionality', 'improve functionality', 'add functionality', 'update functionality', 'add new functionality', 'enhance completion', 'improve completion', 'update completion', 'add feature', 'new feature', 'update feature', 'improve code', 'update code']
-                                generic_words = ['enhance', 'improve', 'update', 'add']  # If these are the main verbs without specifics
-                                
-                                is_generic = any(pattern in subject_lower for pattern in generic_keywords)
-                                # Also check if it's just "verb + generic noun" without specifics
-                                if not is_generic and len(subject_lower.split()) <= 3:
-                                    words = subject_lower.split()
-                                    if len(words) >= 2 and words[0] in generic_words and words[1] in ['functionality', 'feature', 'code', 'completion', 'code', 'implementation']:
-                                        is_generic = True
-                                
-                                is_placeholder = subject_lower in rejected_exact or 'commit message' in subject_lower
-                                
-                                # Be less strict - accept if it's not obviously generic or placeholder
-                                if (not is_generic and not is_placeholder and
-                                    len(subject.strip()) >= 5):  # Reduced from 10 to 5 to be less strict
-                                    if len(subject) > 72:
-                                        subject = subject[:69] + '...'
-                                    logger.info(f"✅ Accepted commit message: {commit_type}: {subject}")
-                                    return f"{commit_type}: {subject}"
-                                else:
-                                    logger.warning(f"Rejected generic/placeholder commit message: {subject}")
-                            # Continue searching if validation failed
+            # Parse lines as they stream in and stop generating at the first
+            # acceptable commit message instead of waiting for the full response.
+            # Use longer timeout for commit message generation (needs more time for quality)
+            with closing(self._iter_completion_lines(prompt, model_to_use, timeout=20)) as lines:
+                for line in lines:
+                    commit_message = self._parse_commit_message_line(line)
+                    if commit_message:
+                        return commit_message
             
             # Fallback: generate descriptive message from diff context
             if diff_context and len(diff_context) > 20:
@@ -1112,20 +1528,115 @@ Write ONLY the commit message:"""
                 return f"{changes['summary'].strip()}"
             return "WIP"
     
+    def _iter_completion_lines(self, prompt: str, model: str,
+                               timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield completion lines as the model generates them.
+
+        Streams from the client when supported, so closing this generator after
+        the first useful line also stops generation on the Ollama side.
+        """
+        if not hasattr(self.client, 'generate_completion_stream'):
+            completion = self.client.generate_completion(prompt, model, use_cache=False, timeout=timeout)
+            logger.debug(f"Raw completion: {completion[:200]}")
+            yield from completion.splitlines()
+            return
+
+        stream = self.client.generate_completion_stream(prompt, model, timeout=timeout)
+        try:
+            buffer = ''
+            for chunk in stream:
+                buffer += chunk
+                while '\n' in buffer:
+                    line, buffer = buffer.split('\n', 1)
+                    yield line
+            if buffer:
+                yield buffer
+        finally:
+            stream.close()
+
+    def _parse_commit_message_line(self, line: str) -> Optional[str]:
+        """Extract a validated 'type: subject' commit message from one response line."""
+        # Remove common prefixes
+        line = _IO_LABEL_RE.sub('', line)
+        line = line.strip()
+        if not line:
+            return None
+
+        # Remove markdown formatting
+        line = line.replace('```', '').replace('`', '').strip()
+
+        # Remove "Conventional Commit Message:" labels
+        line = _COMMIT_LABEL_RE.sub('', line, count=1)
+
+        # Skip explanatory lines
+        if len(line) < 5 or _COMMIT_SKIP_RE.match(line):
+            return None
+
+        # Look for commit message format (type: subject)
+        if ':' not in line[:80]:
+            return None
+
+        line = _TRAILING_PAREN_RE.sub('', line)
+        line = _ADDED_BY_RE.sub('', line)
+        if len(line) <= 8 or ':' not in line:
+            return None
+
+        parts = line.split(':', 1)
+        commit_type = parts[0].strip().lower()
+        subject = parts[1].strip() if len(parts) > 1 else ""
+
+        # Reject generic messages
+        subject_lower = subject.lower().strip()
+        if _GENERIC_SUBJECT_RE.search(subject_lower):
+            logger.warning(f"Rejected generic commit message: {subject}")
+            return None
+
+        # Validate commit type
+        if commit_type not in _VALID_TYPES:
+            # Try to infer from subject
+            subject_lower = subject.lower()
+            if _FEAT_WORDS_RE.search(subject_lower):
+                commit_type = "feat"
+            elif _FIX_WORDS_RE.search(subject_lower):
+                commit_type = "fix"
+            elif _REFACTOR_WORDS_RE.search(subject_lower):
+                commit_type = "refactor"
+            else:
+                commit_type = "feat"  # Default to feat if seems like new functionality
+
+        # Clean subject - remove quotes, extra spaces
+        subject = subject.strip('"').strip("'").strip()
+
+        # Validate subject has meaningful content
+        if len(subject) < 5:
+            return None
+
+        # Reject generic messages
+        subject_lower = subject.lower().strip()
+        # Check for generic patterns (both exact and partial matches)
+        is_generic = bool(_GENERIC_SUBJECT_RE.search(subject_lower))
+        # Also check if it's just "verb + generic noun" without specifics
+        if not is_generic and len(subject_lower.split()) <= 3:
+            words = subject_lower.split()
+            if len(words) >= 2 and words[0] in _GENERIC_VERBS and words[1] in _GENERIC_NOUNS:
+                is_generic = True
+
+        is_placeholder = subject_lower in _REJECTED_SUBJECTS or 'commit message' in subject_lower
+
+        # Be less strict - accept if it's not obviously generic or placeholder
+        if is_generic or is_placeholder:
+            logger.warning(f"Rejected generic/placeholder commit message: {subject}")
+            return None
+
+        if len(subject) > 72:
+            subject = subject[:69] + '...'
+        logger.info(f"✅ Accepted commit message: {commit_type}: {subject}")
+        return f"{commit_type}: {subject}"
+
     def get_smart_commit_message(self, command: str = None) -> Optional[str]:
         """Get smart commit message suggestion based on current git changes."""
         try:
-            # Check if we're in a git repository
-            try:
-                result = subprocess.run(['git', 'rev-parse', '--git-dir'], 
-                                       capture_output=True, text=True, timeout=2)
-                if result.returncode != 0:
-                    logger.debug("Not in a git repository")
-                    return None
-            except Exception as e:
-                logger.debug(f"Git check failed: {e}")
-                return None
-            
+            # Outside a repository this finds no changes; it does its own check
             changes = self._analyze_git_changes()
             
             if not changes['files_changed']:
@@ -1138,21 +1649,19 @@ Write ONLY the commit message:"""
             
             # Clean up the message - remove any unwanted prefixes/suffixes
             if commit_message:
-                import re
                 # Remove any "Input:" or "Output:" labels
-                commit_message = re.sub(r'^(Input|Output|input|output):\s*', '', commit_message, flags=re.IGNORECASE)
+                commit_message = _IO_LABEL_RE.sub('', commit_message)
                 commit_message = commit_message.strip()
                 
                 # Only reject obvious placeholders
-                rejected_exact = ['wip', 'commit message', 'message']
-                if commit_message.lower().strip() in rejected_exact:
+                if commit_message.lower().strip() in _REJECTED_EXACT:
                     logger.debug(f"Rejected generic commit message: {commit_message}")
                     return None
                 
                 # If it's just a type without subject, reject
                 if ':' not in commit_message:
                     # If it's just "update", "changes", etc without colon, reject
-                    if commit_message.lower().strip() in ['update', 'changes', 'fix', 'feat', 'chore']:
+                    if commit_message.lower().strip() in _GENERIC_MESSAGES:
                         logger.debug(f"Rejected too generic commit message (no subject): {commit_message}")
                         return None
                 
@@ -1164,7 +1673,7 @@ Write ONLY the commit message:"""
                         return None
                     # Only reject obvious placeholders in subject
                     subject_lower = subject.lower().strip()
-                    if subject_lower in ['message', 'commit message'] or subject_lower == '"commit message"' or subject_lower == "'commit message'":
+                    if subject_lower in _PLACEHOLDER_SUBJECTS or subject_lower == '"commit message"' or subject_lower == "'commit message'":
                         logger.debug(f"Rejected commit message with placeholder subject: {commit_message}")
                         return None
                     # Accept the message if it passes basic validation
@@ -1184,14 +1693,36 @@ Write ONLY the commit message:"""
         """Get enhanced completion using fine-tuned model."""
         if command and (not self.history or self.history[-1] != command):
             self.history.append(command)
-            self.history = self.history[-10:]
         
-        self.project_context = self._detect_project_context()
+        # Wall-clock budget for the whole Tab press, counted from here: the model
+        # probe, project and git detection, prompt building, the model stream and
+        # waiting on the fallback all have to fit inside it. Commit-message
+        # generation is exempt and keeps its own, longer timeouts.
+        request_timeout = self.config.get('ollama', {}).get('request_timeout', 3)
+        deadline = time.monotonic() + request_timeout
+        
+        # Classified once; checked again before the training-data fallback
+        is_commit = _COMMIT_CMD_RE.match(command) is not None
+        
+        # Looked up once and passed down instead of calling getcwd per helper
+        cwd = os.getcwd()
+        
+        # Replay an earlier completion of the same prefix in this directory without
+        # touching the model. Bare `git` and commit commands are excluded: they
+        # depend on the current repo state.
+        if use_cache and not is_commit and command.strip() != 'git':
+            cached = self._lookup_prefix_cache(command, cwd)
+            if cached:
+                logger.debug(f"Prefix cache hit: {command} -> {cached}")
+                return cached
+        
+        self.project_context = self._get_project_context(cwd)
         
         # Prioritize fine-tuned zsh-assistant model
         model_to_use = self.model
         try:
-            available_models = self.client.get_available_models()
+            available_models = self.client.get_available_models(
+                timeout=min(5, max(0.1, deadline - time.monotonic())))
             # Check for zsh-assistant with or without :latest tag
             zsh_assistant_model = None
             for model in available_models:
@@ -1207,31 +1738,38 @@ Write ONLY the commit message:"""
         
         if command.strip() == "git":
             try:
-                # Check if we're in a git repo and get status
-                subprocess.run(['git', 'rev-parse', '--is-inside-work-tree'], 
-                             check=True, capture_output=True, text=True, timeout=2)
-                
-                # Check for unstaged changes
-                diff_result = subprocess.run(['git', 'diff', '--name-only'],
-                                           capture_output=True, text=True, timeout=2)
-                unstaged_files = [f.strip() for f in diff_result.stdout.strip().split('\n') if f.strip()]
-                
-                # Check for staged changes
-                staged_result = subprocess.run(['git', 'diff', '--cached', '--name-only'],
-                                             capture_output=True, text=True, timeout=2)
-                staged_files = [f.strip() for f in staged_result.stdout.strip().split('\n') if f.strip()]
+                # Unstaged and staged changes, only counted so never decoded.
+                # Both fail outside a repository, so no separate rev-parse check.
+                unstaged_output, staged_output = _run_git_concurrently([
+                    ['git', 'diff', '--name-only'],
+                    ['git', 'diff', '--cached', '--name-only'],
+                ], timeout=min(2, max(0.1, deadline - time.monotonic())))
+                unstaged_files = [f for f in unstaged_output.split(b'\n') if f.strip()]
+                staged_files = [f for f in staged_output.split(b'\n') if f.strip()]
                 
                 # Store git context in project_context for prompt building
                 if unstaged_files:
-                    self.project_context['git_unstaged'] = len(unstaged_files)
+                    self.project_context.git_unstaged = len(unstaged_files)
                 if staged_files:
-                    self.project_context['git_staged'] = len(staged_files)
+                    self.project_context.git_staged = len(staged_files)
             except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
                 pass
         
         # Special handling for git commit commands - ALWAYS prioritize smart commit messages
         # Skip training data check for git commit commands to ensure smart commit runs
-        if (command.strip().startswith('git comm') or 'git commit' in command) and not ('-m' in command or '--message' in command):
+        if _SMART_COMMIT_RE.match(command):
+            # Nothing staged means nothing to describe - skip the LLM round-trip.
+            # `--quiet` exits as soon as it finds the first staged change.
+            if not _COMMIT_ALL_RE.search(command):
+                try:
+                    staged_check = subprocess.run(['git', 'diff', '--cached', '--quiet'],
+                                                  capture_output=True, timeout=1, env=_GIT_ENV)
+                    if staged_check.returncode == 0:
+                        logger.debug("No staged changes, skipping smart commit message")
+                        return command
+                except (FileNotFoundError, subprocess.TimeoutExpired):
+                    pass
+            
             # Try to generate smart commit message FIRST (contextual and better)
             smart_message = None
             try:
@@ -1245,9 +1783,8 @@ Write ONLY the commit message:"""
                 # Reject only actual placeholder messages
                 smart_lower = smart_message.lower().strip()
                 # Reject if it's exactly a placeholder or contains "commit message" as placeholder
-                rejected_exact = ['commit message', 'message', 'wip']
                 # Also reject if it's just "commit message" in quotes or as a standalone phrase
-                is_placeholder = (smart_lower in rejected_exact or 
+                is_placeholder = (smart_lower in _REJECTED_EXACT or 
                                 'commit message' in smart_lower or
                                 smart_message.strip() == '"commit message"' or
                                 smart_message.strip() == "'commit message'")
@@ -1256,11 +1793,11 @@ Write ONLY the commit message:"""
                     len(smart_lower) > 8 and
                     ':' in smart_message and
                     not smart_lower.startswith('commit message')):
-                    result = f'git commit -m "{smart_message}"'
+                    result = _commit_command(command, smart_message)
                     self._save_command(command, result, {
-                        'project_type': self.project_context['project_type'],
+                        'project_type': self.project_context.project_type,
                         'source': 'smart_commit'
-                    })
+                    }, cwd=cwd)
                     logger.info(f"Using smart commit: {smart_message}")
                     return result
                 else:
@@ -1270,53 +1807,40 @@ Write ONLY the commit message:"""
             logger.info("Smart commit failed, trying AI completion fallback...")
             try:
                 prompt = self._build_enhanced_prompt(command)
-                original_timeout = self.client.timeout
-                self.client.timeout = 10
-                try:
-                    # Use fine-tuned model
-                    available_models = self.client.get_available_models()
-                    zsh_model = None
-                    for model in available_models:
-                        if model.startswith("zsh-assistant"):
-                            zsh_model = model
-                            break
-                    model_to_use = zsh_model if zsh_model else self.model
-                    ai_completion = self.client.generate_completion(prompt, model_to_use, use_cache=False)
-                    if ai_completion:
-                        # Extract commit message from AI response
-                        import re
-                        lines = ai_completion.strip().split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            line_lower = line.lower()
-                            # REJECT placeholder commit messages - be very strict
-                            if ('commit message' in line_lower or
-                                line_lower.strip() == 'message' or
-                                line_lower.strip() == '"commit message"' or
-                                line_lower.strip() == "'commit message'" or
-                                line_lower.startswith('commit message')):
-                                logger.warning(f"Rejected placeholder in AI fallback: {line}")
-                                continue
-                            if ':' in line and len(line) > 10 and not line.startswith(('To', 'Here', 'Sure', 'Format', 'Complete', 'The command')):
-                                commit_msg = line.split('\n')[0].strip()
-                                # Clean up
-                                commit_msg = re.sub(r'^(feat|fix|chore|docs|refactor|test|style|perf|build|ci):\s*', '', commit_msg, count=1, flags=re.IGNORECASE)
-                                commit_msg_lower = commit_msg.lower()
-                                # Reject if it's still a placeholder
-                                if (len(commit_msg) > 5 and 
-                                    'commit message' not in commit_msg_lower and
-                                    commit_msg_lower.strip() != 'message' and
-                                    not commit_msg_lower.startswith('commit message')):
-                                    result = f'git commit -m "{commit_msg}"'
-                                    self._save_command(command, result, {
-                                        'project_type': self.project_context['project_type'],
-                                        'source': 'ai_fallback'
-                                    })
-                                    return result
-                                else:
-                                    logger.warning(f"Rejected placeholder commit message in fallback: {commit_msg}")
-                finally:
-                    self.client.timeout = original_timeout
+                # model_to_use already prefers the fine-tuned model
+                ai_completion = self.client.generate_completion(prompt, model_to_use, use_cache=False, timeout=10)
+                if ai_completion:
+                    # Extract commit message from AI response
+                    # Lines are stripped one at a time, so the whole response is not
+                    for line in ai_completion.splitlines():
+                        line = line.strip()
+                        line_lower = line.lower()
+                        # REJECT placeholder commit messages - be very strict
+                        if ('commit message' in line_lower or
+                            line_lower.strip() == 'message' or
+                            line_lower.strip() == '"commit message"' or
+                            line_lower.strip() == "'commit message'" or
+                            line_lower.startswith('commit message')):
+                            logger.warning(f"Rejected placeholder in AI fallback: {line}")
+                            continue
+                        if ':' in line and len(line) > 10 and not line.startswith(('To', 'Here', 'Sure', 'Format', 'Complete', 'The command')):
+                            commit_msg = line.split('\n')[0].strip()
+                            # Clean up
+                            commit_msg = _COMMIT_TYPE_PREFIX_RE.sub('', commit_msg, count=1)
+                            commit_msg_lower = commit_msg.lower()
+                            # Reject if it's still a placeholder
+                            if (len(commit_msg) > 5 and 
+                                'commit message' not in commit_msg_lower and
+                                commit_msg_lower.strip() != 'message' and
+                                not commit_msg_lower.startswith('commit message')):
+                                result = _commit_command(command, commit_msg)
+                                self._save_command(command, result, {
+                                    'project_type': self.project_context.project_type,
+                                    'source': 'ai_fallback'
+                                }, cwd=cwd)
+                                return result
+                            else:
+                                logger.warning(f"Rejected placeholder commit message in fallback: {commit_msg}")
             except Exception as e:
                 logger.debug(f"AI fallback failed: {e}")
             
@@ -1325,71 +1849,53 @@ Write ONLY the commit message:"""
             logger.warning("All commit message generation attempts failed, returning original command")
             return command
         
+        # Look up the training-data fallback in the background while the model runs
+        # Don't use training data fallback for git commit - it likely has "commit message" placeholder
+        fallback_future = None
+        if not is_commit:
+            fallback_future = _EXECUTOR.submit(self._get_fallback_completion, command)
+        
         try:
-            prompt = self._build_enhanced_prompt(command)
-            original_timeout = self.client.timeout
-            self.client.timeout = 5
+            # Program name, split out once for the prompt and the line filter
+            cmd_base = _command_base(command)
+            prompt = self._build_enhanced_prompt(command, cmd_base)
             
-            try:
-                completion = self.client.generate_completion(
-                    prompt, model_to_use, use_cache=use_cache
-                )
-            except Exception as e:
-                logger.debug(f"AI completion error: {e}")
-                completion = None
-            finally:
-                self.client.timeout = original_timeout
+            # Loop invariants
+            cmd_lower = command.lower()
+            cmd_first = cmd_base or command
             
-            # Process AI completion if we got one
-            if completion:
+            # Stream the response and stop at the first acceptable line; closing
+            # the stream stops Ollama from generating the rest.
+            result = None
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
                 try:
-                    lines = completion.strip().split('\n')
-                    for line in lines:
-                        line = line.strip().replace('```', '').strip()
-                        
-                        # Reject any line containing "commit message" as placeholder
-                        line_lower = line.lower()
-                        if ('commit message' in line_lower or 
-                            line_lower.strip() == 'message' or
-                            line_lower.strip() == '"commit message"' or
-                            line_lower.strip() == "'commit message'"):
-                            continue
-                        
-                        reject_prefixes = ('Complete command:', 'The command', 'You should', 'Run:', 'To complete', 'This will', 'You can', 'Enter', 'Note:', 'Suggestion:', 'Output:', 'Context:', 'Project:')
-                        if line.startswith(reject_prefixes) or any(phrase in line.lower() for phrase in ('the logical', 'next step', 'you should', 'complete command:')):
-                            continue
-                        
-                        if (line and len(line) > len(command) and 
-                            not line.startswith(('To complete', 'This will', 'You can', 'Run:', 'Note:', 'Suggestion:', 'Output:', 'Context:', 'Project:')) and
-                            not line.startswith(('1.', '2.', '3.', '- ', '* ')) and
-                            not line.endswith(':') and not line.startswith('$') and
-                            not line.startswith('`') and not line.endswith('`') and
-                            '|' not in line[:20] and
-                            (command.lower() in line.lower() or line.startswith(command.split()[0] if command.split() else command)) and
-                            (line[0].isalpha() or line[0] in './')):
-                            result = line
-                            git_info = self._get_git_info()
-                            git_branch = None
-                            if git_info and 'Branch:' in git_info:
-                                try:
-                                    git_branch = git_info.split('Branch:')[1].strip().split('\n')[0]
-                                except:
-                                    pass
-                            self._save_command(command, result, {
-                                'project_type': self.project_context['project_type'],
-                                'git_branch': git_branch,
-                                'source': 'ai'
-                            })
-                            logger.debug(f"AI completion: {command} -> {result}")
-                            return result
+                    with closing(self._iter_completion_lines(prompt, model_to_use, timeout=remaining)) as lines:
+                        result = next((line for line in _completion_candidates(lines)
+                                       if _is_acceptable(line, command, cmd_lower, cmd_first)), None)
                 except Exception as e:
-                    logger.warning(f"AI completion processing failed: {e}")
+                    logger.debug(f"AI completion error: {e}")
+            
+            if result:
+                if fallback_future:
+                    fallback_future.cancel()
+                # Parsed while the prompt was built, so no second git info lookup
+                self._save_command(command, result, {
+                    'project_type': self.project_context.project_type,
+                    'git_branch': self._git_branch,
+                    'source': 'ai'
+                }, cwd=cwd)
+                logger.debug(f"AI completion: {command} -> {result}")
+                return result
         except Exception as e:
             logger.warning(f"AI completion failed: {e}")
         
-        # Don't use training data fallback for git commit - it likely has "commit message" placeholder
-        if not (command.strip().startswith('git comm') or 'git commit' in command):
-            fallback_completion = self._get_fallback_completion(command)
+        if fallback_future:
+            try:
+                fallback_completion = fallback_future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                logger.debug("Training data fallback missed the completion deadline")
+                fallback_completion = None
             if fallback_completion:
                 # Double-check for "commit message" placeholder
                 if 'commit message' in fallback_completion.lower() and '"commit message"' in fallback_completion:
@@ -1397,9 +1903,10 @@ Write ONLY the commit message:"""
                 else:
                     logger.debug(f"AI failed, using training data fallback: {command} -> {fallback_completion}")
                     self._save_command(command, fallback_completion, {
-                        'project_type': self.project_context['project_type'],
+                        'project_type': self.project_context.project_type,
+                        'git_branch': self._git_branch,
                         'source': 'training_data'
-                    })
+                    }, cwd=cwd)
                     return fallback_completion
         
         # Return original command if no completion found (better than placeholder)
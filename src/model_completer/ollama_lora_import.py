@@ -508,9 +508,13 @@ PARAMETER repeat_penalty 1.1
         except Exception:
             return False
     
-    def convert_to_gguf(self, merged_model_dir: Path) -> Optional[Path]:
+    def convert_to_gguf(self, merged_model_dir: Path, outtype: str = "q8_0") -> Optional[Path]:
         """Convert merged model to GGUF format.
         
+        Weights are written as 8-bit (q8_0) by default: decoding is memory-bound,
+        so halving the weight size versus f16 roughly halves time per token for
+        the short interactive completions, at negligible quality cost.
+        
         Tries multiple methods:
         1. llama.cpp convert_hf_to_gguf.py script (download if needed)
         2. Fallback: return None (will use base model approach)
@@ -518,7 +522,9 @@ PARAMETER repeat_penalty 1.1
         logger.info("🔄 Converting merged model to GGUF format...")
         logger.info("   This will allow Ollama to use the merged LoRA adapter directly")
         
-        gguf_file = merged_model_dir / "model.gguf"
+        # Named per weight type, so a different outtype is never served from
+        # an earlier conversion
+        gguf_file = merged_model_dir / f"model-{outtype}.gguf"
         
         # Check if already converted
         if gguf_file.exists():
@@ -572,12 +578,13 @@ PARAMETER repeat_penalty 1.1
         if convert_script:
             try:
                 logger.info(f"🔧 Using convert script: {convert_script}")
-                logger.info(f"   Converting: {merged_model_dir} -> {gguf_file}")
+                logger.info(f"   Converting: {merged_model_dir} -> {gguf_file} ({outtype})")
                 logger.info("   This may take several minutes...")
                 
                 # Run conversion
                 result = subprocess.run(
-                    ['python3', convert_script, str(merged_model_dir), '--outfile', str(gguf_file)],
+                    ['python3', convert_script, str(merged_model_dir), '--outfile', str(gguf_file),
+                     '--outtype', outtype],
                     capture_output=True,
                     text=True,
                     timeout=1800  # 30 minutes timeout for conversion
@@ -774,7 +781,7 @@ def check_if_using_merged_lora(base_dir: Optional[Path] = None) -> bool:
         # Check for common model files
         model_files = list(merged_dir.glob("*.safetensors")) + \
                      list(merged_dir.glob("*.bin")) + \
-                     list(merged_dir.glob("model.gguf"))
+                     list(merged_dir.glob("model-*.gguf"))
         if model_files:
             return True
     
@@ -7,7 +7,8 @@ def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
     default_config = {
         'ollama': {
             'url': 'http://localhost:11434',
-            'timeout': 30
+            'timeout': 30,
+            'request_timeout': 3
         },
         'model': 'zsh-assistant',
         'cache': {
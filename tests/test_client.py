@@ -1,10 +1,11 @@
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 from src.model_completer.client import OllamaClient
 
 class TestOllamaClient(unittest.TestCase):
     
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_is_server_available(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -16,7 +17,7 @@ class TestOllamaClient(unittest.TestCase):
         self.assertTrue(result)
         mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=2)
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate_completion(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -24,7 +25,61 @@ class TestOllamaClient(unittest.TestCase):
         mock_post.return_value = mock_response
         
         client = OllamaClient()
+        client.cache = MagicMock()
+        client.cache.get.return_value = None
         result = client.generate_completion("git comm", "test-model")
         
         self.assertEqual(result, "git commit -m \"message\"")
-        mock_post.assert_called_once()
\ No newline at end of file
+        mock_post.assert_called_once()
+    
+    @patch('requests.Session.post')
+    def test_generate_completion_timeout_override(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"response": "ls -la"}
+        mock_post.return_value = mock_response
+        
+        client = OllamaClient(timeout=30)
+        client.generate_completion("ls", "test-model", use_cache=False, timeout=5)
+        
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], 5)
+        self.assertEqual(client.timeout, 30)
+    
+    @patch('requests.Session.post')
+    def test_generate_completion_stream(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = [
+            b'{"response": "feat: add", "done": false}',
+            b'{"response": " streaming\\n", "done": false}',
+            b'{"response": "", "done": true}',
+        ]
+        mock_post.return_value = mock_response
+        
+        client = OllamaClient()
+        chunks = list(client.generate_completion_stream("git comm", "test-model"))
+        
+        self.assertEqual(chunks, ["feat: add", " streaming\n"])
+        self.assertTrue(mock_post.call_args.kwargs['stream'])
+        self.assertTrue(mock_post.call_args.kwargs['json']['stream'])
+    
+    @patch('requests.Session.post')
+    def test_generate_completion_stream_deadline(self, mock_post):
+        def slow_lines():
+            for _ in range(20):
+                time.sleep(0.1)
+                yield b'{"response": "x", "done": false}'
+        
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = slow_lines()
+        mock_post.return_value = mock_response
+        
+        client = OllamaClient()
+        start = time.monotonic()
+        chunks = list(client.generate_completion_stream("ls", "test-model", timeout=0.35))
+        
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertLess(len(chunks), 20)
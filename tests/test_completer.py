@@ -0,0 +1,21 @@
+import unittest
+from src.model_completer.completer import _parse_status_v2_branch
+
+
+class TestGitInfoParsing(unittest.TestCase):
+    
+    def test_formats_entries_like_status_short(self):
+        output = (
+            '# branch.oid 0123abc\n'
+            '# branch.head main\n'
+            '1 MM N... 100644 100644 100644 aaa bbb src/app.py\n'
+            '2 R. N... 100644 100644 100644 aaa bbb R100 new.txt\told.txt\n'
+            '? notes.txt\n'
+        )
+        self.assertEqual(_parse_status_v2_branch(output), (
+            'main',
+            'MM src/app.py\nR  old.txt -> new.txt\n?? notes.txt',
+        ))
+    
+    def test_detached_head_has_no_branch(self):
+        self.assertEqual(_parse_status_v2_branch('# branch.head (detached)\n'), ('', ''))
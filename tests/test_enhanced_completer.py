@@ -0,0 +1,147 @@
+import shlex
+import unittest
+from datetime import datetime, timedelta
+from src.model_completer.enhanced_completer import (
+    EnhancedCompleter, _commit_command, _completion_candidates, _heuristic_commit_message,
+    _is_acceptable, _json_loads_lines, _parse_status_v2
+)
+
+class TestAcceptancePredicate(unittest.TestCase):
+    
+    def check(self, line, command):
+        cmd_parts = command.split()
+        return _is_acceptable(line, command, command.lower(), cmd_parts[0] if cmd_parts else command)
+    
+    def test_accepts_command_line(self):
+        self.assertTrue(self.check("docker run -it ubuntu bash", "docker run"))
+        self.assertTrue(self.check("./manage.py runserver", "./manage.py"))
+    
+    def test_rejects_explanations_and_placeholders(self):
+        self.assertFalse(self.check("Note: docker run starts a container", "docker run"))
+        self.assertFalse(self.check("1. docker run -it ubuntu", "docker run"))
+        self.assertFalse(self.check("`docker run -it ubuntu`", "docker run"))
+        self.assertFalse(self.check("git commit -m \"commit message\"", "git comm"))
+        self.assertFalse(self.check("docker run", "docker run"))
+
+
+class TestCompletionCandidates(unittest.TestCase):
+    
+    def test_fences_and_blank_lines_do_not_count(self):
+        response = "```bash\n\n# list files\n\nls -la\n```"
+        self.assertEqual(list(_completion_candidates(response.splitlines())),
+                         ["# list files", "ls -la"])
+    
+    def test_inline_fenced_command_is_kept(self):
+        self.assertEqual(list(_completion_candidates(["```ls -la```"])), ["ls -la"])
+
+
+class TestPrefixCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.completer = EnhancedCompleter.__new__(EnhancedCompleter)
+        self.completer._prefix_cache = {}
+        self.completer._get_git_state = lambda: ('main', '')
+        self.completer._remember_prefix({
+            'command': 'git ch',
+            'completion': 'git checkout main',
+            'context': {'source': 'ai', 'git_branch': 'main'},
+            'working_dir': '/work/app',
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    def test_hit_on_longer_prefix(self):
+        self.assertEqual(self.completer._lookup_prefix_cache("git che", '/work/app'), "git checkout main")
+    
+    def test_miss_when_completion_diverges(self):
+        self.assertIsNone(self.completer._lookup_prefix_cache("git cherry", '/work/app'))
+    
+    def test_miss_from_another_directory(self):
+        self.assertIsNone(self.completer._lookup_prefix_cache("git che", '/work/other'))
+    
+    def test_miss_on_another_branch(self):
+        self.completer._get_git_state = lambda: ('feature-x', '')
+        self.assertIsNone(self.completer._lookup_prefix_cache("git che", '/work/app'))
+    
+    def test_miss_when_expired(self):
+        self.completer._remember_prefix({
+            'command': 'npm run t',
+            'completion': 'npm run test',
+            'context': {'source': 'ai'},
+            'working_dir': '/work/app',
+            'timestamp': (datetime.now() - timedelta(days=2)).isoformat()
+        })
+        self.assertIsNone(self.completer._lookup_prefix_cache("npm run te", '/work/app'))
+    
+    def test_skips_unreplayable_sources(self):
+        self.completer._remember_prefix({
+            'command': 'git comm',
+            'completion': 'git commit -m "feat: add cache"',
+            'context': {'source': 'smart_commit'},
+            'working_dir': '/work/app',
+            'timestamp': datetime.now().isoformat()
+        })
+        self.assertNotIn(('/work/app', 'git comm'), self.completer._prefix_cache)
+
+
+class TestHistoryDecoding(unittest.TestCase):
+    
+    def test_skips_malformed_lines(self):
+        lines = [b'{"command": "ls"}', b'{"command": "git st', b'{"command": "pwd"}']
+        self.assertEqual(_json_loads_lines(lines), [{'command': 'ls'}, {'command': 'pwd'}])
+
+
+class TestStatusParsing(unittest.TestCase):
+    
+    def test_parses_ordinary_renamed_and_untracked_entries(self):
+        output = (
+            b'1 M. N... 100644 100644 100644 aaa bbb m.txt\0'
+            b'2 RM N... 100644 100644 100644 aaa bbb R100 new name.txt\0old.txt\0'
+            b'? untracked.txt\0'
+        )
+        self.assertEqual(_parse_status_v2(output), [
+            ('M.', 'm.txt'),
+            ('RM', 'new name.txt'),
+            ('??', 'untracked.txt'),
+        ])
+
+
+class TestHeuristicCommitMessage(unittest.TestCase):
+    
+    def changes(self, files, added=(), lines=5):
+        return {
+            'files_changed': list(files),
+            'files_added': list(added),
+            'files_deleted': [],
+            'files_modified': [f for f in files if f not in added],
+            'lines_added': lines,
+            'lines_removed': 0,
+        }
+    
+    def test_docs_only_change(self):
+        self.assertEqual(_heuristic_commit_message(self.changes(['README.md', 'docs/usage.rst'])),
+                         "docs: update README.md and 1 more")
+    
+    def test_new_test_file(self):
+        self.assertEqual(_heuristic_commit_message(self.changes(['tests/test_cli.py'], added=['tests/test_cli.py'])),
+                         "test: add test_cli.py")
+    
+    def test_code_or_large_changes_need_the_model(self):
+        self.assertIsNone(_heuristic_commit_message(self.changes(['README.md', 'src/app.py'])))
+        self.assertIsNone(_heuristic_commit_message(self.changes(['README.md'], lines=200)))
+    
+    def test_hostile_file_name_stays_inside_the_quoted_message(self):
+        message = _heuristic_commit_message(self.changes(['$(touch PWNED).md'], added=['$(touch PWNED).md']))
+        self.assertEqual(message, "docs: add $(touch PWNED).md")
+        command = _commit_command("git commit", message)
+        self.assertEqual(command, "git commit -m 'docs: add $(touch PWNED).md'")
+        self.assertEqual(shlex.split(command), ['git', 'commit', '-m', message])
+
+
+class TestCommitCommand(unittest.TestCase):
+    
+    def test_completes_partial_command(self):
+        self.assertEqual(_commit_command("git comm", "fix: typo"), "git commit -m 'fix: typo'")
+    
+    def test_keeps_typed_flags(self):
+        self.assertEqual(_commit_command("git commit -a", "fix: typo"), "git commit -a -m 'fix: typo'")
+        self.assertEqual(_commit_command("git commit -am", "fix: typo"), "git commit -am 'fix: typo'")